@@ -0,0 +1,210 @@
+"""
+Benchmarks the merge path against the fake ollama server.
+
+Drives `BackendLLM.generate_result`, the merge scheduler's `GenerateTask`s and the
+`ChipGraphicsItem` collision handling, and reports latency percentiles, throughput and
+allocations as JSON so runs can be compared.
+
+    python benchmarks/bench_merge.py --requests 200 --concurrency 4 --latency 0.05 --output bench.json
+
+With `--hosts` the merges are spread over several fake servers, pair it with `--parallel`
+so each server has a fixed capacity and throughput shows how it scales with the number of hosts.
+"""
+import argparse, json, os, platform, sys, tempfile, time, tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from fake_ollama import FakeOllama
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def summarize(name: str, latencies: list[float], elapsed: float, alloc: tuple[int, int] | None, **extra) -> dict:
+    result = {
+        "benchmark": name,
+        "samples": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0,
+        **extra,
+    }
+    if alloc is not None:
+        result["alloc_current_kib"] = alloc[0] / 1024
+        result["alloc_peak_kib"] = alloc[1] / 1024
+    return result
+
+
+class Measure:
+    """Times a block and optionally traces its allocations"""
+
+    def __init__(self, trace_alloc: bool) -> None:
+        self.trace_alloc = trace_alloc
+        self.elapsed = 0.0
+        self.alloc = None
+
+    def __enter__(self):
+        if self.trace_alloc:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        if self.trace_alloc:
+            self.alloc = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+
+def pairs(count: int) -> list[tuple[str, str]]:
+    # unique pairs so nothing is answered from a cache
+    return [("🌍 Earth", f"✨ Thing {i}") for i in range(count)]
+
+
+def bench_backend(requests: int, concurrency: int, trace_alloc: bool) -> dict:
+    from backend import BackendLLM
+
+    llm = BackendLLM()
+    latencies = []
+
+    def merge(pair):
+        start = time.perf_counter()
+        _, err = llm.generate_result(*pair)
+        if err:
+            raise RuntimeError(err)
+        latencies.append(time.perf_counter() - start)
+
+    with Measure(trace_alloc) as m:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(merge, pairs(requests)))
+    return summarize("backend.generate_result", latencies, m.elapsed, m.alloc, concurrency=concurrency)
+
+
+def bench_generate_task(requests: int, trace_alloc: bool) -> dict:
+    from PySide6.QtCore import QEventLoop
+    from chip_widget import ChipGraphicsItem
+    from generate_task import MergeScheduler
+
+    scheduler = MergeScheduler()
+    loop = QEventLoop()
+    started: dict[int, float] = {}
+    latencies = []
+    errors = []
+
+    def finished(task):
+        latencies.append(time.perf_counter() - started[id(task)])
+        if task.err_msg:
+            errors.append(task.err_msg)
+        if len(latencies) == requests:
+            loop.quit()
+
+    scheduler.finished.connect(finished)
+    chips = [(ChipGraphicsItem(first), ChipGraphicsItem(second)) for first, second in pairs(requests)]
+
+    with Measure(trace_alloc) as m:
+        for chip1, chip2 in chips:
+            submit_time = time.perf_counter()
+            started[id(scheduler.submit(chip1, chip2))] = submit_time
+        loop.exec()
+
+    if errors:
+        raise RuntimeError(errors[0])
+    return summarize("generate_task", latencies, m.elapsed, m.alloc, concurrency=scheduler.max_in_flight)
+
+
+# QGraphicsScene rebuilds its BSP index on a 2 s timer after items were added, wait a bit longer than that
+INDEX_SETTLE_MS = 2500
+
+
+def bench_collision(chips: int, moves: int, trace_alloc: bool) -> dict:
+    from PySide6.QtCore import QEventLoop, QTimer
+    from PySide6.QtWidgets import QGraphicsScene
+    from chip_widget import ChipGraphicsItem
+
+    scene = QGraphicsScene()
+    columns = max(1, int(chips ** 0.5))
+    for i in range(chips):
+        chip = ChipGraphicsItem(f"🌍 Chip {i}")
+        chip.setPos((i % columns) * 120, (i // columns) * 50)
+        scene.addItem(chip)
+
+    dragged = ChipGraphicsItem("🔥 Fire")
+    scene.addItem(dragged)
+    latencies = []
+
+    # without the event loop the index is never built and every query walks all items
+    settle = QEventLoop()
+    QTimer.singleShot(INDEX_SETTLE_MS, settle.quit)
+    settle.exec()
+
+    with Measure(trace_alloc) as m:
+        for i in range(moves):
+            # a diagonal drag over the whole canvas
+            dragged.setPos((i * 7) % (columns * 120), (i * 3) % (columns * 50))
+            start = time.perf_counter()
+            dragged.update_merge_highlight()
+            dragged.find_merge_target()
+            latencies.append(time.perf_counter() - start)
+    return summarize("chip_collision", latencies, m.elapsed, m.alloc, chips=chips)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake server takes per completion")
+    parser.add_argument("--hosts", type=int, default=1, help="fake servers the merges are spread over")
+    parser.add_argument("--parallel", type=int, default=0, help="completions each fake server generates at once, 0 for no limit")
+    parser.add_argument("--chips", type=int, default=1000, help="chips on the canvas for the collision benchmark")
+    parser.add_argument("--moves", type=int, default=500)
+    parser.add_argument("--no-alloc", action="store_true", help="skip tracemalloc, it slows everything down")
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    args = parser.parse_args()
+
+    servers = [FakeOllama(latency=args.latency, parallel=args.parallel).start() for _ in range(max(1, args.hosts))]
+    os.chdir(tempfile.mkdtemp(prefix="inf-bench-"))
+    with open("inf_config.json", "w") as f:
+        json.dump({
+            "base_url": servers[0].url,
+            "hosts": [server.url for server in servers],
+            "model": servers[0].models[0],
+            "cache_size": 0,
+            "max_concurrent_requests": args.concurrency,
+            "max_connections_per_host": args.concurrency,
+            "prefetch_enabled": False,
+        }, f)
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication(sys.argv[:1])
+
+    trace_alloc = not args.no_alloc
+    results = {
+        "python": platform.python_version(),
+        "latency_s": args.latency,
+        "timestamp": time.time(),
+        "benchmarks": [
+            # max_concurrent_requests is per host
+            bench_backend(args.requests, args.concurrency * len(servers), trace_alloc),
+            bench_generate_task(args.requests, trace_alloc),
+            bench_collision(args.chips, args.moves, trace_alloc),
+        ],
+        "hosts": len(servers),
+        "server_requests": [server.requests for server in servers],
+    }
+
+    out = json.dumps(results, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out)
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
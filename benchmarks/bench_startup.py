@@ -0,0 +1,65 @@
+"""
+Measures how long the game takes to show its window and which imports it pays for on the way.
+
+Runs `src/main.py` with `-X importtime` in a fresh directory, the app quits itself right after the
+first paint. Fails when the time to window is over the budget or a module that should load lazily
+was imported during startup.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 1500
+"""
+import argparse, json, os, re, statistics, subprocess, sys, tempfile
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "main.py")
+
+# only needed once the player merges or opens the settings
+LAZY_MODULES = ["ollama", "httpx", "backend", "generate_task", "settings", "fetch_ollama_models"]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)")
+
+
+def run_once() -> tuple[dict, list[tuple[int, str]]]:
+    env = dict(os.environ, INFINITE_SIDES_STARTUP_CHECK="1", QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(MAIN)],
+        cwd=tempfile.mkdtemp(prefix="inf-startup-"), env=env, capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr[-2000:])
+
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = []
+    for line in proc.stderr.splitlines():
+        if (match := IMPORTTIME_LINE.match(line)) and not match.group(3):
+            # top level imports only, cumulative microseconds
+            imports.append((int(match.group(2)), match.group(4)))
+    return report, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=10, help="slowest top level imports to list")
+    args = parser.parse_args()
+
+    times = []
+    for _ in range(args.runs):
+        report, imports = run_once()
+        times.append(report["time_to_window_ms"])
+
+    eager = [module for module in LAZY_MODULES if module in report["modules"]]
+    result = {
+        "time_to_window_ms_median": statistics.median(times),
+        "time_to_window_ms_max": max(times),
+        "budget_ms": args.budget_ms,
+        "slowest_imports_ms": [[name, us / 1000] for us, name in sorted(imports, reverse=True)[:args.top]],
+        "eagerly_imported": eager,
+    }
+    print(json.dumps(result, indent=4))
+
+    if result["time_to_window_ms_median"] > args.budget_ms or eager:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
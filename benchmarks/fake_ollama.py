@@ -0,0 +1,127 @@
+"""
+A stand-in for the ollama server that answers `/api/chat` and `/api/tags` with a configurable latency,
+used by the benchmarks so they measure the game and not the model.
+
+    python benchmarks/fake_ollama.py --port 11435 --latency 0.2 --parallel 2
+"""
+import argparse, contextlib, hashlib, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESULTS = ["🌱 Plant", "💨 Steam", "🌋 Lava", "🌊 Wave", "🌈 Rainbow", "🌼 Dandelion", "🧱 Brick", "⚡ Energy"]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # set on the server class by FakeOllama
+    server: "FakeOllama"
+
+    def log_message(self, format, *args):
+        pass
+
+    def route(self) -> str:
+        # the game appends /v1 to the base url, accept both
+        path = self.path.split("?")[0]
+        return path[3:] if path.startswith("/v1/") else path
+
+    def send_json(self, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_chunk(self, body: dict):
+        data = json.dumps(body).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.route() != "/api/tags":
+            self.send_error(404)
+            return
+        self.send_json({"models": [{"name": name, "model": name} for name in self.server.models]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.route() != "/api/chat":
+            self.send_error(404)
+            return
+
+        self.server.count_request()
+        with self.server.slots:
+            self.answer(body)
+
+    def answer(self, body: dict):
+        prompt = body["messages"][-1]["content"]
+        result = RESULTS[int(hashlib.sha1(prompt.encode("utf-8")).hexdigest(), 16) % len(RESULTS)]
+        stats = {
+            "done": True,
+            "prompt_eval_count": sum(len(m["content"]) for m in body["messages"]) // 4,
+            "prompt_eval_duration": int(self.server.latency * 0.5e9),
+            "eval_count": 3,
+            "eval_duration": int(self.server.latency * 0.5e9),
+            "total_duration": int(self.server.latency * 1e9),
+        }
+
+        if not body.get("stream", True):
+            time.sleep(self.server.latency)
+            self.send_json({"model": body["model"], "message": {"role": "assistant", "content": result}, **stats})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        tokens = result.split(" ")
+        tokens = [tokens[0]] + [" " + token for token in tokens[1:]] + ["\n"]
+        try:
+            for token in tokens:
+                time.sleep(self.server.latency / len(tokens))
+                self.send_chunk({"model": body["model"], "message": {"role": "assistant", "content": token}, "done": False})
+            self.send_chunk({"model": body["model"], "message": {"role": "assistant", "content": ""}, **stats})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # the game closes the stream as soon as it has a complete result
+            self.close_connection = True
+
+
+class FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.05, models: list[str] | None = None, parallel: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), FakeOllamaHandler)
+        self.latency = latency
+        # completions generated at once like ollama's OLLAMA_NUM_PARALLEL, 0 for no limit
+        self.slots = threading.Semaphore(parallel) if parallel else contextlib.nullcontext()
+        self.models = models or ["fake:latest"]
+        self.requests = 0
+        self.__lock = threading.Lock()
+
+    def count_request(self):
+        with self.__lock:
+            self.requests += 1
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeOllama":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per completion")
+    parser.add_argument("--parallel", type=int, default=0, help="completions generated at once, 0 for no limit")
+    args = parser.parse_args()
+
+    server = FakeOllama(args.port, args.latency, parallel=args.parallel)
+    print(f"fake ollama on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
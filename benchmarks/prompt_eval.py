@@ -0,0 +1,69 @@
+"""
+Measures how long ollama spends evaluating the prompt for every merge.
+
+`cold` puts a unique line in front of the system message on every merge so the prefix can never
+be reused (how every merge behaves when the prefix isn't stable), `warm` sends the prefix exactly
+like the game does. Needs a running ollama with the given model.
+
+    python benchmarks/prompt_eval.py --model llama2 --merges 10
+"""
+import argparse, asyncio, json, os, statistics, sys, tempfile, uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backend import AsyncBackendLLM
+from configmanager import ConfigManger
+from consts import DEFAULT_BASE_URL, DEFAULT_CHIPS, DEFAULT_SYSTEM_MSG
+
+
+async def run_mode(mode: str, merges: int) -> dict:
+    conf_manager = ConfigManger()
+    llm = AsyncBackendLLM()
+    durations = []
+    counts = []
+
+    # warm the model up so loading it isn't counted as prompt evaluation
+    await llm.generate_result("🌍 Earth", "🔥 Fire")
+
+    for i in range(merges):
+        if mode == "cold":
+            conf_manager.set_key_value("system_msg", f"[{uuid.uuid4().hex}]\n{DEFAULT_SYSTEM_MSG}")
+
+        first = DEFAULT_CHIPS[i % len(DEFAULT_CHIPS)]
+        second = f"✨ Thing {i}"
+        _, err = await llm.generate_result(first, second)
+        if err:
+            raise SystemExit(err)
+
+        durations.append(llm.last_stats.get("prompt_eval_duration", 0) / 1e6)
+        counts.append(llm.last_stats.get("prompt_eval_count", 0))
+
+    conf_manager.set_key_value("system_msg", DEFAULT_SYSTEM_MSG)
+    await llm.close()
+    return {
+        "mode": mode,
+        "merges": merges,
+        "prompt_eval_ms_mean": statistics.mean(durations),
+        "prompt_eval_ms_median": statistics.median(durations),
+        "prompt_eval_tokens_mean": statistics.mean(counts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--model", default="llama2")
+    parser.add_argument("--merges", type=int, default=10)
+    args = parser.parse_args()
+
+    # a throwaway config so the real one and the result cache are left alone
+    os.chdir(tempfile.mkdtemp(prefix="inf-bench-"))
+    with open("inf_config.json", "w") as f:
+        json.dump({"base_url": args.base_url, "model": args.model, "cache_size": 0, "stream": False}, f)
+
+    results = [asyncio.run(run_mode(mode, args.merges)) for mode in ("cold", "warm")]
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,47 @@
 # from openai import OpenAI, NotFoundError, APIConnectionError
-from ollama import Client, RequestError, ChatResponse, ResponseError
-from consts import DEFAULT_EXAMPLES
+import asyncio, threading, hashlib, json, time
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, TypeVar
+import httpx
+from ollama import AsyncClient, RequestError, ChatResponse, ResponseError
+from consts import DEFAULT_EXAMPLES, DEFAULT_CACHE_SIZE, DEFAULT_REQUEST_TIMEOUT, DEFAULT_MAX_CONNECTIONS_PER_HOST, DEFAULT_STREAM, DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX, DEFAULT_RECIPE_LOOKUP, DEFAULT_HOSTS, RETRY_SYSTEM_MSG, RETRY_MAX_TOKENS
 from configmanager import ConfigManger
+from combination_cache import CombinationCache
+from recipe_store import RecipeStore
+from chip_text import extract_complete_result, validate_result
+from event_loop import shared_loop
+from host_pool import HostPool
+from perf import metrics
 
-class BackendLLM:
+T = TypeVar("T")
+
+
+class SharedCall:
+    """An Ollama call shared by every merge of the same pair that comes in while it is running"""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.task: asyncio.Task | None = None
+        # merges still waiting for the result
+        self.waiters = 0
+        self.listeners: list[Callable[[str], None]] = []
+
+    def on_token(self, partial: str):
+        for listener in list(self.listeners):
+            listener(partial)
+
+class AsyncBackendLLM:
     """
     base_url: Base url for ollama the default is `http://localhost:11434/v1`
     system_msg: The system message for the LLM
     examples (optional): The examples help it understand the game, default is `[{"role": "user", "content": '"🌍 Earth + 💧 Water"'}, {"role": "assistant", "content": '🌱 Plant'}]`
+
+    Requests go through a `HostPool` over the configured `hosts` (just `base_url` when there are none),
+    its pooled clients are kept alive across merges and only rebuilt when the hosts, timeout
+    or connection limit change. Must be used from a single event loop.
     """
 
     def __init__(self) -> None:
-        
+
         self.conf_manager = ConfigManger()
         conf = self.conf_manager.get_config()
         self.base_url: str = conf["base_url"]
@@ -20,11 +50,32 @@ class BackendLLM:
 
         self.examples = DEFAULT_EXAMPLES
         self.system_msg = conf["system_msg"]
-        self.__client = Client(
-            host=self.base_url,
-        )
+        self.request_timeout: float = conf.get("request_timeout", DEFAULT_REQUEST_TIMEOUT)
+        self.max_connections: int = conf.get("max_connections_per_host", DEFAULT_MAX_CONNECTIONS_PER_HOST)
+        self.stream: bool = conf.get("stream", DEFAULT_STREAM)
+        self.recipe_lookup: bool = conf.get("recipe_lookup", DEFAULT_RECIPE_LOOKUP)
+        self.keep_alive: str | int = conf.get("keep_alive", DEFAULT_KEEP_ALIVE)
+        self.num_ctx: int = conf.get("num_ctx", DEFAULT_NUM_CTX)
+        self.hosts: list[str] = conf.get("hosts", DEFAULT_HOSTS) or [self.base_url]
+        self.pool = HostPool()
+        self.pool.configure(self.hosts, self.request_timeout, self.max_connections)
+
+        # system message plus examples, compiled once and only rebuilt when one of them changes
+        self.prompt_prefix: tuple[dict, ...] = ()
+        self.prompt_fingerprint = ""
+        # timings ollama reported for the last merge that ran to completion
+        self.last_stats: dict = {}
+        self.cache = CombinationCache(max_size=conf.get("cache_size", DEFAULT_CACHE_SIZE))
+        self.recipes = RecipeStore()
+        # cache key -> call running for it, identical merges wait for the same call
+        self.__in_flight: dict[str, SharedCall] = {}
 
-        self.final_examples = []
+        # examples are only in the config, so load it fully on the first merge
+        self.settings_changed = True
+        self.conf_manager.add_listener(self.on_config_changed)
+
+    def on_config_changed(self, conf: dict):
+        self.settings_changed = True
 
     def check_base_url(self):
         if not self.base_url.endswith("/v1"):
@@ -35,70 +86,325 @@ class BackendLLM:
             self.conf_manager.set_base_url(self.base_url)
 
     def reload_settings(self):
+        start = time.perf_counter()
+        self.settings_changed = False
         conf = self.conf_manager.get_config()
         if self.base_url != (new_base_url := conf["base_url"]):
             self.base_url = new_base_url
             self.check_base_url()
-            self.__client = Client(
-                host=self.base_url,
-            )
 
-        self.system_msg = conf["system_msg"]
+        self.hosts = conf.get("hosts", DEFAULT_HOSTS) or [self.base_url]
+        self.request_timeout = conf.get("request_timeout", DEFAULT_REQUEST_TIMEOUT)
+        self.max_connections = conf.get("max_connections_per_host", DEFAULT_MAX_CONNECTIONS_PER_HOST)
+        self.pool.configure(self.hosts, self.request_timeout, self.max_connections)
+
+        if (conf["system_msg"], conf["examples"]) != (self.system_msg, self.examples) or not self.prompt_prefix:
+            self.system_msg = conf["system_msg"]
+            self.examples = conf["examples"]
+            self.compile_prompt_prefix()
         self.model = conf["model"]
-        self.examples = conf["examples"]
+        self.stream = conf.get("stream", DEFAULT_STREAM)
+        self.recipe_lookup = conf.get("recipe_lookup", DEFAULT_RECIPE_LOOKUP)
+        self.keep_alive = conf.get("keep_alive", DEFAULT_KEEP_ALIVE)
+        self.num_ctx = conf.get("num_ctx", DEFAULT_NUM_CTX)
+        self.cache.set_max_size(conf.get("cache_size", DEFAULT_CACHE_SIZE))
+        metrics.record("backend.config_reload_ms", (time.perf_counter() - start) * 1000)
+
+    async def get_pool(self) -> HostPool:
+        # picks up hand edits of the config file, listeners only fire for changes made through the app
+        self.conf_manager.reload_if_changed()
+        if self.settings_changed:
+            self.reload_settings()
+        await self.pool.ready()
+        return self.pool
+
+    async def call_with_failover(self, call: Callable[[AsyncClient], Awaitable[T]]) -> T:
+        """
+        Runs `call` with the client of the least loaded host, when the host is unreachable
+        or answers with a server error it is ejected and the next host is tried.
+        """
+        pool = await self.get_pool()
+        tried = []
+        while (host := pool.acquire(exclude=tried)) is not None:
+            tried.append(host)
+            start = time.perf_counter()
+            try:
+                result = await call(host.client)
+            except (httpx.HTTPError, ResponseError) as e:
+                # a missing model or a bad request would fail the same way on every host
+                host_failed = not isinstance(e, ResponseError) or e.status_code >= 500
+                pool.release(host, failed=host_failed)
+                if not host_failed or len(tried) >= len(pool.hosts):
+                    raise
+                metrics.increment("backend.failovers")
+                continue
+            except BaseException:
+                pool.release(host)
+                raise
+            pool.release(host, latency_ms=(time.perf_counter() - start) * 1000)
+            return result
+        raise httpx.ConnectError("No Ollama host is configured")
 
-    def convert_examples(self):
-        self.final_examples.clear()
+    async def close(self):
+        await self.pool.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.cache.flush)
+
+    def compile_prompt_prefix(self):
+        # the system message and examples are sent first and always byte identical and in the same order,
+        # that way ollama can reuse the evaluated prefix from its KV cache and only evaluate the new pair
+        prefix = [
+            {"role": "system", "content": self.system_msg},
+        ]
         for example in self.examples:
-            self.final_examples.extend(
+            prefix.extend(
                 [
                     {"role": "user", "content": f'"{example["from_str"].strip()}"'},
                     {"role": "assistant", "content": example["result_str"].strip()},
                 ]
             )
 
-    def generate_result(self, first: str, second: str) -> tuple[str | None, str | None]:
+        # shared by every merge, never mutate the messages
+        self.prompt_prefix = tuple(prefix)
+        raw = json.dumps(prefix, ensure_ascii=False)
+        self.prompt_fingerprint = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    async def list_models(self) -> list[str]:
+        ollama_models = await self.call_with_failover(lambda client: client.list())
+        return [model["name"] for model in ollama_models['models']]
+
+    def chat_options(self) -> dict:
+        return {
+            "top_p": 1,
+            "temperature": 0,
+            "num_ctx": self.num_ctx,
+            "stop": [
+                "[\n",
+                "\r\n",
+                "\n",
+                "\"",
+                "<|im_end|>",
+                "<|start_header_id|>",
+                "<|end_header_id|>",
+                "<|eot_id|>",
+                "<|reserved_special_token",
+            ]
+        }
+
+    def update_stats(self, response: dict):
+        self.last_stats = {
+            key: response[key]
+            for key in ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "total_duration")
+            if key in response
+        }
+        if "eval_count" in self.last_stats:
+            metrics.record("ollama.eval_count", self.last_stats["eval_count"])
+        if "prompt_eval_count" in self.last_stats:
+            metrics.record("ollama.prompt_eval_count", self.last_stats["prompt_eval_count"])
+        if "prompt_eval_duration" in self.last_stats:
+            metrics.record("ollama.prompt_eval_ms", self.last_stats["prompt_eval_duration"] / 1e6)
+
+    async def stream_chat(self, client: AsyncClient, messages: list[dict], on_token: Callable[[str], None] | None, options: dict | None = None) -> str:
+        """
+        Reads the completion token by token and stops as soon as a complete "emoji Text" is parsed,
+        closing the stream aborts the request so Ollama doesn't keep generating.
+        """
+        start = time.perf_counter()
+        stream = await client.chat(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            options=options or self.chat_options(),
+            keep_alive=self.keep_alive,
+        )
+
+        content = ""
+        try:
+            async for part in stream:
+                if not content:
+                    metrics.record("backend.first_token_ms", (time.perf_counter() - start) * 1000)
+                content += part['message']['content']
+                if on_token:
+                    on_token(content)
+                if (result := extract_complete_result(content)) is not None:
+                    return result
+                if part.get('done'):
+                    self.update_stats(part)
+                    break
+        finally:
+            await stream.aclose()
+
+        return content
+
+    def cached_result(self, first: str, second: str) -> str | None:
+        self.conf_manager.reload_if_changed()
+        if self.settings_changed:
+            self.reload_settings()
+        return self.cache.get(self.cache.make_key(first, second, self.model, self.prompt_fingerprint))
+
+    async def generate_result(
+        self,
+        first: str,
+        second: str,
+        on_token: Callable[[str], None] | None = None,
+        slot: Callable[[], AsyncContextManager] | None = None,
+    ) -> tuple[str | None, str | None]:
+        """
+        `on_token` is called with the partial completion while streaming,
+        `slot` is held only while an Ollama request is made, answers from the cache or recipes don't wait for it.
+        """
+        with metrics.timed("backend.total_ms"):
+            return await self.__generate_result(first, second, on_token, slot)
+
+    async def __generate_result(self, first: str, second: str, on_token: Callable[[str], None] | None, slot: Callable[[], AsyncContextManager] | None) -> tuple[str | None, str | None]:
         if not first or not second:
             return None, "Invalid Input"
-        
-        self.reload_settings()
-        
-        result = f'"{first} + {second}"'
-
-        self.convert_examples()
-        messages = [
-            {"role": "system", "content": self.system_msg},     
-        ]
-        messages.extend(self.final_examples)
-        messages.append({"role": "user", "content": result})
+
+        await self.get_pool()
+
+        cache_key = self.cache.make_key(first, second, self.model, self.prompt_fingerprint)
+        # entries from before results were validated may still be in the cache
+        if (cached := self.cache.get(cache_key)) is not None and (cached := validate_result(cached)) is not None:
+            metrics.increment("backend.cache_hits")
+            return cached, None
+
+        # recipes the player already discovered with this model, the cache may have evicted them
+        if self.recipe_lookup and (known := self.recipes.lookup(first, second, self.model)) is not None:
+            self.cache.put(cache_key, known)
+            metrics.increment("backend.recipe_hits")
+            return known, None
+
+        call = self.__in_flight.get(cache_key)
+        if call is None:
+            call = SharedCall(cache_key)
+            call.task = asyncio.ensure_future(self.__ask_llm(first, second, cache_key, call.on_token, slot))
+            call.task.add_done_callback(lambda _: self.__forget_call(call))
+            self.__in_flight[cache_key] = call
+        else:
+            metrics.increment("backend.coalesced")
+
+        call.waiters += 1
+        if on_token:
+            call.listeners.append(on_token)
         try:
-            response: ChatResponse = self.__client.chat(
-                model=self.model,
-                messages=messages,
-                stream=False,
-                options={
-                    "top_p": 1,
-                    "temperature": 0,
-                    "stop": [
-                        "[\n", 
-                        "\r\n", 
-                        "\n", 
-                        "\"", 
-                        "<|im_end|>",
-                        "<|start_header_id|>",
-                        "<|end_header_id|>",
-                        "<|eot_id|>",
-                        "<|reserved_special_token",
-                    ]
-                }
-            )
+            # shielded, cancelling one merge must not cancel the call the others are waiting for
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if on_token:
+                call.listeners.remove(on_token)
+            if call.waiters == 0 and not call.task.done():
+                # every merge waiting for it was cancelled
+                self.__forget_call(call)
+                call.task.cancel()
+
+    def __forget_call(self, call: SharedCall):
+        if self.__in_flight.get(call.key) is call:
+            del self.__in_flight[call.key]
+
+    async def __ask_llm(self, first: str, second: str, cache_key: str, on_token: Callable[[str], None], slot: Callable[[], AsyncContextManager] | None) -> tuple[str | None, str | None]:
+        # only the merge starting the call takes a slot, merges joining it wait without one
+        if slot is None:
+            return await self.__request(first, second, cache_key, on_token)
+        async with slot():
+            return await self.__request(first, second, cache_key, on_token)
+
+    async def __request(self, first: str, second: str, cache_key: str, on_token: Callable[[str], None]) -> tuple[str | None, str | None]:
+        with metrics.timed("backend.message_build_ms"):
+            result = f'"{first} + {second}"'
+
+            messages = list(self.prompt_prefix)
+            messages.append({"role": "user", "content": result})
+
+        content, err = await self.__chat(messages, on_token, self.stream, self.chat_options())
+        if err:
+            return None, err
+
+        # trivial mistakes are repaired locally, only an answer without a usable result is asked again
+        if (result := validate_result(content)) is None:
+            metrics.increment("backend.retries")
+            retry_messages = [
+                {"role": "system", "content": RETRY_SYSTEM_MSG},
+                {"role": "user", "content": f"{first} + {second}"},
+            ]
+            content, err = await self.__chat(retry_messages, None, False, {**self.chat_options(), "num_predict": RETRY_MAX_TOKENS})
+            if err:
+                return None, err
+            result = validate_result(content)
+
+        if result is None:
+            metrics.increment("backend.invalid_results")
+            return None, f'The model did not answer with an "emoji Text" result: {content.strip()[:100]}'
+
+        # only validated results are cached, a malformed answer would otherwise stick around
+        self.cache.put(cache_key, result)
+        return result, None
+
+    async def __chat(self, messages: list[dict], on_token: Callable[[str], None] | None, stream: bool, options: dict) -> tuple[str, str | None]:
+        metrics.increment("backend.llm_calls")
+        network_start = time.perf_counter()
+        try:
+            if stream:
+                content = await self.call_with_failover(lambda client: self.stream_chat(client, messages, on_token, options))
+            else:
+                response: ChatResponse = await self.call_with_failover(lambda client: client.chat(
+                    model=self.model,
+                    messages=messages,
+                    stream=False,
+                    options=options,
+                    keep_alive=self.keep_alive,
+                ))
+                content = response['message']['content']
+                self.update_stats(response)
         except RequestError as e:
-            return None, str(e)
+            return "", str(e)
         except ResponseError as e:
-            return None, str(e)
+            return "", str(e)
+        except httpx.HTTPError as e:
+            return "", str(e)
+        finally:
+            metrics.record("backend.network_ms", (time.perf_counter() - network_start) * 1000)
+
+        return content, None
+
+    async def generate_many(self, pairs: list[tuple[str, str]], concurrency: int) -> AsyncIterator[tuple[str, str, str | None, str | None]]:
+        """Generates every pair with at most `concurrency` requests at once, yields `(first, second, result, err)` as they finish"""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def generate(first: str, second: str):
+            async with semaphore:
+                result, err = await self.generate_result(first, second)
+                return first, second, result, err
+
+        for done in asyncio.as_completed([generate(first, second) for first, second in pairs]):
+            yield await done
+
+
+_shared_backend: AsyncBackendLLM | None = None
+_shared_lock = threading.Lock()
+
+def shared_backend() -> AsyncBackendLLM:
+    """The backend used by the whole app, it must only be awaited on `shared_loop()`"""
+    global _shared_backend
+    with _shared_lock:
+        if _shared_backend is None:
+            _shared_backend = AsyncBackendLLM()
+        return _shared_backend
+
+
+class BackendLLM:
+    """Blocking wrapper around the shared `AsyncBackendLLM` for code outside the event loop"""
+
+    def __init__(self) -> None:
+        self.llm = shared_backend()
+        self.loop = shared_loop()
+
+    def generate_result(self, first: str, second: str) -> tuple[str | None, str | None]:
+        return self.loop.submit(self.llm.generate_result(first, second)).result()
+
+    def list_models(self) -> list[str]:
+        return self.loop.submit(self.llm.list_models()).result()
 
-        return response['message']['content'], None
 
 if __name__ == '__main__':
-    llm = BackendLLM()
-    print(llm.generate_result("🌊 Wave", "💧 Water"))
\ No newline at end of file
+    from batch_generate import main
+    main()
@@ -0,0 +1,122 @@
+"""
+Generates the combination graph of a list of chips without the GUI.
+
+Every depth combines the chips found in the previous one with everything discovered so far,
+results are appended to a JSONL file as they arrive and an interrupted run picks up where it stopped
+when started again with the same output file.
+
+    python src/batch_generate.py "🌍 Earth" "💧 Water" "🔥 Fire" --depth 2 --concurrency 4 --output recipes.jsonl
+"""
+import argparse, asyncio, json, os
+
+from backend import AsyncBackendLLM
+from chip_text import normalize_chip_text
+from configmanager import ConfigManger
+
+
+def pair_key(first: str, second: str) -> tuple[str, str]:
+    return tuple(sorted((normalize_chip_text(first), normalize_chip_text(second))))
+
+
+def load_done(output: str) -> dict[tuple[str, str], dict]:
+    done = {}
+    if not os.path.exists(output):
+        return done
+
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line of an interrupted run can be cut off
+                continue
+            if record.get("result"):
+                done[pair_key(record["first"], record["second"])] = record
+    return done
+
+
+def drop_torn_line(output: str):
+    """Cuts off a last line without a newline, left by a run that was killed while writing it"""
+    if not os.path.exists(output):
+        return
+
+    with open(output, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - 4096)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            if (newline := chunk.rfind(b"\n")) != -1:
+                f.truncate(start + newline + 1)
+                return
+            pos = start
+        f.truncate(0)
+
+
+async def generate_graph(llm: AsyncBackendLLM, chips: list[str], depth: int, concurrency: int, output: str):
+    done = load_done(output)
+    # new records must not be glued onto a cut off one
+    drop_torn_line(output)
+    # normalized text -> text as first seen
+    discovered: dict[str, str] = {}
+    for chip in chips:
+        discovered.setdefault(normalize_chip_text(chip), chip)
+    frontier = list(discovered.values())
+
+    with open(output, "a", encoding="utf-8") as f:
+        for level in range(1, depth + 1):
+            known = list(discovered.values())
+            pairs: dict[tuple[str, str], tuple[str, str]] = {}
+            for first in frontier:
+                for second in known:
+                    pairs.setdefault(pair_key(first, second), (first, second))
+
+            results: list[str] = []
+            todo = []
+            for key, pair in pairs.items():
+                if key in done:
+                    results.append(done[key]["result"])
+                else:
+                    todo.append(pair)
+
+            print(f"depth {level}: {len(pairs)} pairs, {len(todo)} to generate")
+            async for first, second, result, err in llm.generate_many(todo, concurrency):
+                record = {"first": first, "second": second, "result": result and result.strip(), "model": llm.model, "depth": level}
+                if err:
+                    record["error"] = err
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                if record["result"]:
+                    results.append(record["result"])
+
+            frontier = []
+            for result in results:
+                if (key := normalize_chip_text(result)) not in discovered:
+                    discovered[key] = result
+                    frontier.append(result)
+
+            if not frontier:
+                break
+
+    print(f"{len(discovered)} chips discovered")
+    await llm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("chips", nargs="*", help="starting chips, the default chips from the config when empty")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4, help="ollama requests in flight at once")
+    parser.add_argument("--output", default="recipes.jsonl")
+    args = parser.parse_args()
+
+    chips = args.chips or ConfigManger().get_value("default_chips")
+    try:
+        asyncio.run(generate_graph(AsyncBackendLLM(), chips, args.depth, args.concurrency, args.output))
+    except KeyboardInterrupt:
+        print(f"interrupted, run again with --output {args.output} to resume")
+
+
+if __name__ == "__main__":
+    main()
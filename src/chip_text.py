@@ -0,0 +1,94 @@
+import re
+import unicodedata
+
+# pictographic ranges, good enough to tell an emoji apart from text without extra dependencies
+EMOJI_CHARS = (
+    "\u00a9\u00ae\u203c\u2049\u2122\u2139\u2194-\u21ff\u2300-\u23ff\u24c2\u25a0-\u27bf"
+    "\u2900-\u297f\u2b00-\u2bff\u3030\u303d\u3297\u3299\U0001F000-\U0001FAFF"
+)
+# variation selectors, zero width joiner, keycaps and skin tones that glue emoji together
+EMOJI_MODIFIERS = "\ufe0e\ufe0f\u200d\u20e3\U0001F3FB-\U0001F3FF"
+# one emoji including the ones built from plain characters, keycaps like `1️⃣` are a digit, a selector and U+20E3
+EMOJI_SEQUENCE = rf"(?:[{EMOJI_CHARS}]|[0-9#*]\ufe0f?\u20e3)[{EMOJI_CHARS}{EMOJI_MODIFIERS}]*"
+
+# characters that can't be part of a result, seeing one means the result is over
+RESULT_TERMINATORS = "\n\"(="
+# punctuation that can be part of a name (`St. Louis`, `12:00`), it only ends the result
+# when a lowercase word follows, like the start of an explanation
+SOFT_TERMINATORS = ".,;:!?"
+
+# leading emoji of a chip and the spacing after it, `🌋Lava` and `🌋  Lava` are the same chip
+LEADING_EMOJI_PATTERN = re.compile(rf"^({EMOJI_SEQUENCE})\s*")
+# presentation selectors only change how an emoji is drawn, not which one it is
+VARIATION_SELECTOR_PATTERN = re.compile("[\ufe0e\ufe0f]")
+
+COMPLETE_RESULT_PATTERN = re.compile(
+    rf'^\s*"?\s*({EMOJI_SEQUENCE}\s*[^{RESULT_TERMINATORS}]*?[^\s{RESULT_TERMINATORS}])'
+    rf'\s*(?:[{RESULT_TERMINATORS}]|[{SOFT_TERMINATORS}]\s+[a-z\u00e0-\u00ff])'
+)
+
+# words a result may have after its emoji, anything longer is an explanation and not a chip
+MAX_RESULT_WORDS = 4
+# quotes and markdown models put around the result
+RESULT_QUOTES = "\"'`\u201c\u201d\u2018\u2019*"
+
+# the prompt repeated in front of the answer, `"🌍 Earth + 💧 Water" = 🌱 Plant`
+ECHOED_PROMPT_PATTERN = re.compile(r"^.*(?:=|->|\u2192)\s*")
+RESULT_LABEL_PATTERN = re.compile(r"^(?:result|answer|output)\s*:\s*", re.IGNORECASE)
+# an explanation after the result, `🌱 Plant (grows from earth)`, `🌱 Plant, a green thing` or `🌱 Plant - a green thing`
+TRAILING_TEXT_PATTERN = re.compile(rf"\s*(?:[{RESULT_TERMINATORS}]|[{SOFT_TERMINATORS}]\s+[a-z\u00e0-\u00ff]|\s[-\u2013\u2014]\s).*$")
+# punctuation closing the result, the last dot of an abbreviation like `D.C.` is kept
+TRAILING_PUNCTUATION_PATTERN = re.compile(r"\s*(?:[,;:!?]+|(?<!\.\w)\.)$")
+TRAILING_EMOJI_PATTERN = re.compile(rf"^([^{EMOJI_CHARS}]+?)\s*({EMOJI_SEQUENCE})$")
+VALID_RESULT_PATTERN = re.compile(rf"^{EMOJI_SEQUENCE} [^{RESULT_TERMINATORS}]*\w[^{RESULT_TERMINATORS}]*$")
+
+
+def normalize_chip_text(text: str) -> str:
+    """
+    Canonical form of a chip text used for lookups and duplicate checks,
+    surrounding quotes, emoji variation selectors and repeated whitespace are dropped,
+    the emoji is always followed by one space and case is folded
+    so `' "🌍  Earth" '`, `'🌍Earth'` and `'🌍 earth'` compare equal.
+    """
+    text = unicodedata.normalize("NFC", text.strip().strip('"').strip())
+    text = VARIATION_SELECTOR_PATTERN.sub("", text)
+    text = LEADING_EMOJI_PATTERN.sub(r"\1 ", text)
+    return " ".join(text.split()).casefold()
+
+
+def extract_complete_result(partial: str) -> str | None:
+    """
+    Returns the "emoji Text" result from a partial completion once it is known to be finished,
+    that is when something that can't belong to the result follows it, otherwise None.
+    """
+    match = COMPLETE_RESULT_PATTERN.match(partial)
+    if match is None:
+        return None
+    return match.group(1)
+
+
+def validate_result(raw: str) -> str | None:
+    """
+    Turns a completion into a clean "emoji Text" result, repairing what models commonly get wrong around it:
+    quotes, the prompt repeated in front, an "=" or "Result:" prefix, an explanation after it
+    or the emoji put at the end. Returns None when no valid result can be recovered.
+    """
+    lines = raw.strip().splitlines()
+    if not lines:
+        return None
+
+    text = ECHOED_PROMPT_PATTERN.sub("", lines[0].strip())
+    text = RESULT_LABEL_PATTERN.sub("", text.strip().strip(RESULT_QUOTES).strip())
+    if " + " in text:
+        # only the input was repeated, there is no answer in it
+        return None
+    text = TRAILING_TEXT_PATTERN.sub("", text.strip(RESULT_QUOTES).strip())
+    text = TRAILING_PUNCTUATION_PATTERN.sub("", text.strip(RESULT_QUOTES)).strip(RESULT_QUOTES)
+    text = TRAILING_EMOJI_PATTERN.sub(r"\2 \1", text.strip())
+    text = " ".join(LEADING_EMOJI_PATTERN.sub(r"\1 ", text).split())
+
+    if VALID_RESULT_PATTERN.match(text) is None:
+        return None
+    if len(text.split()) - 1 > MAX_RESULT_WORDS:
+        return None
+    return text
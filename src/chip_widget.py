@@ -2,48 +2,145 @@ from PySide6.QtWidgets import (
     QGraphicsSceneMouseEvent,
     QGraphicsItem,
     QGraphicsTextItem,
-    QLabel,
-    QGraphicsDropShadowEffect
+    QGraphicsDropShadowEffect,
+    QStyledItemDelegate,
 )
 
-from PySide6.QtCore import Qt, QMimeData
-from PySide6.QtGui import QColor, QMouseEvent, QPainter, QPen, QBrush, QDrag, QLinearGradient
+from PySide6.QtCore import Qt, QMimeData, QRectF, QSize, QAbstractListModel, QModelIndex
+from PySide6.QtGui import QColor, QPainter, QPen, QBrush, QDrag, QLinearGradient, QFontMetrics, QPixmap, QPixmapCache
 from typing import Literal
+from chip_text import normalize_chip_text
+from search_index import ChipSearchIndex
 
 ThemeLiteral = Literal["dark"] | Literal["light"]
 
-class Chip(QLabel):
+# rendered chips are shared between every chip with the same text, theme and state
+QPixmapCache.setCacheLimit(64 * 1024)  # KiB
 
-    def __init__(self, text: str, add_chip_func, theme: ThemeLiteral = "light") -> None:
-        super().__init__(text)
-        self.add_chip_func = add_chip_func
+class ChipListModel(QAbstractListModel):
+    """
+    Texts of the discovered chips, the sidebar only paints the rows that are visible.
+    Normalized texts are indexed so duplicates are found without walking the list,
+    and a search index narrows the rows down to the ones matching the filter.
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.__texts: list[str] = []
+        self.__index: set[str] = set()
+        self.__search_index = ChipSearchIndex()
+        self.__query = ""
+        # rows of __texts matching the filter, None when there is no filter
+        self.__visible: list[int] | None = None
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        if self.__visible is not None:
+            return len(self.__visible)
+        return len(self.__texts)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = index.row() if self.__visible is None else self.__visible[index.row()]
+        return self.__texts[row]
+
+    def flags(self, index: QModelIndex):
+        return Qt.ItemIsEnabled
+
+    def contains(self, text: str) -> bool:
+        return normalize_chip_text(text) in self.__index
+
+    def add_chips(self, texts: list[str]):
+        """Adds the texts that aren't discovered yet"""
+        new_texts = []
+        for text in texts:
+            key = normalize_chip_text(text)
+            if key in self.__index:
+                continue
+            self.__index.add(key)
+            new_texts.append(text)
+
+        if not new_texts:
+            return
+
+        first = len(self.__texts)
+        if self.__visible is None:
+            self.beginInsertRows(QModelIndex(), first, first + len(new_texts) - 1)
+            self.__append(new_texts)
+            self.endInsertRows()
+            return
+
+        # rows outside of the filter are kept but not shown
+        self.__append(new_texts)
+        matching = [row for row in range(first, len(self.__texts)) if self.__search_index.matches(row, self.__query)]
+        if matching:
+            first_visible = len(self.__visible)
+            self.beginInsertRows(QModelIndex(), first_visible, first_visible + len(matching) - 1)
+            self.__visible.extend(matching)
+            self.endInsertRows()
+
+    def __append(self, texts: list[str]):
+        for text in texts:
+            self.__texts.append(text)
+            self.__search_index.add(text)
+
+    def add_chip(self, text: str):
+        self.add_chips([text])
+
+    def set_filter(self, query: str):
+        rows = self.__search_index.search(query)
+        self.beginResetModel()
+        self.__query = query
+        self.__visible = None if rows is None else sorted(rows)
+        self.endResetModel()
+
+    def texts(self) -> list[str]:
+        return list(self.__texts)
+
+    def chip_count(self) -> int:
+        """Number of chips including the ones hidden by the filter"""
+        return len(self.__texts)
+
+    def clear(self):
+        self.beginResetModel()
+        self.__texts.clear()
+        self.__index.clear()
+        self.__search_index.clear()
+        if self.__visible is not None:
+            self.__visible = []
+        self.endResetModel()
+
+
+class ChipDelegate(QStyledItemDelegate):
+    """Paints a sidebar row as a chip, replaces one styled QLabel per discovered chip"""
+
+    def __init__(self, theme: ThemeLiteral = "light", parent=None) -> None:
+        super().__init__(parent)
         self.theme = theme
         self.border_radius = 10
-        self.setAlignment(Qt.AlignCenter)
-        
+        self.height = 40
+
+    def sizeHint(self, option, index: QModelIndex) -> QSize:
+        text = index.data(Qt.DisplayRole)
+        # 10px padding on both sides and a 1px border
+        return QSize(option.fontMetrics.horizontalAdvance(text) + 22, self.height)
 
+    def paint(self, painter: QPainter, option, index: QModelIndex):
         backgroundClr = QColor(255, 255, 255) if self.theme == "light" else QColor(0, 0, 0)
         color = QColor(0, 0, 0) if self.theme == "light" else QColor(255, 255, 255)
+        r = QRectF(option.rect).adjusted(0.5, 0.5, -0.5, -0.5)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QPen(QColor("gray")))
+        painter.setBrush(backgroundClr)
+        painter.drawRoundedRect(r, self.border_radius, self.border_radius)
+        painter.setPen(color)
+        painter.drawText(r, Qt.AlignCenter, index.data(Qt.DisplayRole))
+        painter.restore()
 
-        self.setStyleSheet(f"""
-            background-color: {backgroundClr.name()};
-            padding: 5px;
-            padding-left: 10px;
-            padding-right: 10px;
-            border-radius: 10px;       
-            color: {color.name()};
-            border: 1px solid gray;
-        """)
-        
-        self.setCursor(Qt.PointingHandCursor)
-        self.setFixedHeight(40)   
-
-    def mousePressEvent(self, ev: QMouseEvent) -> None:
-        super().mousePressEvent(ev)
-
-        if ev.button() == Qt.LeftButton:
-            self.add_chip_func(self)
-          
 
 class ChipGraphicsItem(QGraphicsTextItem):
 
@@ -51,6 +148,8 @@ class ChipGraphicsItem(QGraphicsTextItem):
         super().__init__(text)
         self.theme = theme
         self.loading = False
+        # streamed text of the merge this chip is loading for
+        self.partial_text = ""
         self.setFlag(QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemIsMovable) 
 
         self.holding_down = False
@@ -66,16 +165,84 @@ class ChipGraphicsItem(QGraphicsTextItem):
         self.merge_gradient.setColorAt(1, QColor(0, 255, 0, 50))
 
         self.merge_clr = False
-
+        # the chip currently highlighted as the one this chip would merge with
+        self.merge_target: "ChipGraphicsItem | None" = None
 
     def boundingRect(self):
         # calculate
         rect = super().boundingRect()
         return rect.adjusted(-4, -4, 4, 4)
     
+    @property
+    def loading(self) -> bool:
+        return self._loading
+
+    @loading.setter
+    def loading(self, value: bool):
+        self._loading = value
+        self.update()
+
+    @property
+    def holding_down(self) -> bool:
+        return self._holding_down
+
+    @holding_down.setter
+    def holding_down(self, value: bool):
+        self._holding_down = value
+        self.update()
+
+    @property
+    def merge_clr(self) -> bool:
+        return self._merge_clr
+
+    @merge_clr.setter
+    def merge_clr(self, value: bool):
+        self._merge_clr = value
+        self.update()
+
+    @property
+    def partial_text(self) -> str:
+        return self._partial_text
+
+    @partial_text.setter
+    def partial_text(self, value: str):
+        self._partial_text = value
+        self.update()
+
+    def state(self) -> str:
+        if self.loading:
+            return "loading"
+        elif self.holding_down:
+            return "holding"
+        elif self.merge_clr:
+            return "merge"
+        return "normal"
+
     def paint(self, painter, option, widget):
+        # the chip is only rendered again when its text, theme or state changes
         r = self.boundingRect()
+        dpr = painter.device().devicePixelRatioF()
+        text = self.partial_text if self.loading and self.partial_text else self.toPlainText()
+        key = f"chip:{self.theme}:{self.state()}:{r.width()}x{r.height()}@{dpr}:{text}"
+
+        pixmap = QPixmap()
+        if not QPixmapCache.find(key, pixmap):
+            pixmap = QPixmap((r.size() * dpr).toSize())
+            pixmap.setDevicePixelRatio(dpr)
+            pixmap.fill(Qt.transparent)
+
+            chip_painter = QPainter(pixmap)
+            chip_painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            chip_painter.setFont(self.font())
+            # gradients are in item coordinates
+            chip_painter.translate(-r.topLeft())
+            self.paint_chip(chip_painter, r)
+            chip_painter.end()
+            QPixmapCache.insert(key, pixmap)
 
+        painter.drawPixmap(r.topLeft(), pixmap)
+
+    def paint_chip(self, painter: QPainter, r: QRectF):
         themed_bg_color = None
         if self.theme == "light":
             painter.setPen(QPen(QColor(0, 0, 0)))
@@ -93,10 +260,14 @@ class ChipGraphicsItem(QGraphicsTextItem):
             painter.setBrush(self.merge_gradient)
         else:
             painter.setBrush(themed_bg_color)
-        
+
 
         painter.drawRoundedRect(r, 8, 8)
-        painter.drawText(r, Qt.AlignCenter, self.toPlainText())
+
+        text = self.toPlainText()
+        if self.loading and self.partial_text:
+            text = QFontMetrics(self.font()).elidedText(self.partial_text, Qt.ElideRight, int(r.width()) - 8)
+        painter.drawText(r, Qt.AlignCenter, text)
 
     def mousePressEvent(self, event: QGraphicsSceneMouseEvent) -> None:
         super().mousePressEvent(event)    
@@ -115,29 +286,41 @@ class ChipGraphicsItem(QGraphicsTextItem):
             if self.holding_down:
                 self.holding_down = False
 
-        for item in self.scene().items():
-            # check if item bounding touching current
-            if item == self:
+        self.set_merge_target(None)
+        if (item := self.find_merge_target()) is not None:
+            # print(f"{self.toPlainText()} is touching {item.toPlainText()}")
+            for view in self.scene().views():
+                view.chip_connected.emit(self, item)
+            return
+
+        self.setZValue(0)
+
+    def find_merge_target(self) -> "ChipGraphicsItem | None":
+        # ask the scene's BSP index for the items under this chip instead of walking every item
+        for item in self.scene().items(self.sceneBoundingRect(), Qt.IntersectsItemBoundingRect):
+            if item is self or not isinstance(item, ChipGraphicsItem):
                 continue
 
             if self.collidesWithItem(item):
-                # print(f"{self.toPlainText()} is touching {item.toPlainText()}")
-                for view in self.scene().views():
-                    view.chip_connected.emit(self, item)
-                return
-
-        self.setZValue(0)
+                return item
+        return None
 
     def mouseMoveEvent(self, event: QGraphicsSceneMouseEvent) -> None:
         super().mouseMoveEvent(event)
-        for item in self.scene().items():
-            # check if item bounding touching current
-            if item == self:
-                continue
+        self.update_merge_highlight()
 
-            if self.collidesWithItem(item):
-                # print(f"{self.toPlainText()} is touching {item.toPlainText()}")
-                item.merge_clr = True
-                return
-            else:
-                item.merge_clr = False
\ No newline at end of file
+    def update_merge_highlight(self):
+        self.set_merge_target(self.find_merge_target())
+
+    def set_merge_target(self, target: "ChipGraphicsItem | None"):
+        # only the previous and the new target change, nothing else needs touching
+        if target is self.merge_target:
+            return
+
+        if self.merge_target is not None:
+            self.merge_target.merge_clr = False
+            self.merge_target.update()
+        if target is not None:
+            target.merge_clr = True
+            target.update()
+        self.merge_target = target
\ No newline at end of file
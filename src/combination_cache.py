@@ -0,0 +1,110 @@
+import atexit, json, os, hashlib, threading
+from collections import OrderedDict
+
+from chip_text import normalize_chip_text
+from consts import DEFAULT_CACHE_SIZE
+from game_save import atomic_write_json
+
+# seconds after a change before the cache is written, changes in between are written together
+FLUSH_DELAY = 2.0
+
+
+class CombinationCache:
+    """
+    Persistent LRU cache for merge results.
+
+    file: Where the cache is stored between runs, default is `combination-cache.json`
+    max_size: Maximum number of results kept, the least recently used one is evicted first
+
+    Changes are written by a background thread a moment after they happen,
+    so a merge never waits for the whole file to be rewritten. `flush` writes right away.
+    """
+
+    def __init__(self, file: str = "combination-cache.json", max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.file = file
+        self.max_size = max_size
+        self.__entries: OrderedDict[str, str] = OrderedDict()
+        self.__lock = threading.Lock()
+        # one write at a time, the timer thread and `flush` may race otherwise
+        self.__write_lock = threading.Lock()
+        self.__flush_timer: threading.Timer | None = None
+        self.__dirty = False
+        self.load()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(first: str, second: str, model: str, prompt_fingerprint: str) -> str:
+        """`prompt_fingerprint` identifies the system message and examples the result was generated with"""
+        # order independent, "A + B" and "B + A" give the same answer at temperature 0
+        pair = sorted((normalize_chip_text(first), normalize_chip_text(second)))
+        raw = json.dumps([pair, model, prompt_fingerprint], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def load(self):
+        if not os.path.exists(self.file):
+            return
+
+        try:
+            with open(self.file, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            # a broken cache is not worth crashing over, it will be rebuilt
+            return
+
+        with self.__lock:
+            self.__entries = OrderedDict(entries)
+            self.__evict()
+
+    def save(self):
+        """Schedules a write, several changes within `FLUSH_DELAY` cost one write"""
+        with self.__lock:
+            self.__dirty = True
+            if self.__flush_timer is not None:
+                return
+            self.__flush_timer = threading.Timer(FLUSH_DELAY, self.flush)
+            self.__flush_timer.daemon = True
+            self.__flush_timer.start()
+
+    def flush(self):
+        with self.__write_lock:
+            with self.__lock:
+                if self.__flush_timer is not None:
+                    self.__flush_timer.cancel()
+                    self.__flush_timer = None
+                if not self.__dirty:
+                    return
+                self.__dirty = False
+                entries = list(self.__entries.items())
+
+            atomic_write_json(self.file, entries)
+
+    def get(self, key: str) -> str | None:
+        with self.__lock:
+            result = self.__entries.get(key)
+            if result is not None:
+                self.__entries.move_to_end(key)
+            return result
+
+    def put(self, key: str, result: str):
+        with self.__lock:
+            self.__entries[key] = result
+            self.__entries.move_to_end(key)
+            self.__evict()
+        self.save()
+
+    def set_max_size(self, max_size: int):
+        with self.__lock:
+            self.max_size = max_size
+            self.__evict()
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+        self.save()
+
+    def __evict(self):
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.__entries)
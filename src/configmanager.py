@@ -1,8 +1,20 @@
-import json, os
+import json, os, copy, threading
+from typing import Callable
 
-from consts import DEFAULT_BASE_URL, DEFAULT_SYSTEM_MSG, DEFAULT_MODEL, DEFAULT_EXAMPLES, DEFAULT_CHIPS
+from consts import DEFAULT_BASE_URL, DEFAULT_SYSTEM_MSG, DEFAULT_MODEL, DEFAULT_EXAMPLES, DEFAULT_CHIPS, DEFAULT_CACHE_SIZE, DEFAULT_MAX_CONCURRENT_REQUESTS, DEFAULT_REQUEST_TIMEOUT, DEFAULT_MAX_CONNECTIONS_PER_HOST, DEFAULT_STREAM, DEFAULT_KEEP_ALIVE, DEFAULT_NUM_CTX, DEFAULT_PREFETCH_ENABLED, DEFAULT_PREFETCH_PER_MINUTE, DEFAULT_PREFETCH_RECENT_CHIPS, DEFAULT_VIEWPORT_UPDATE_MODE, DEFAULT_RECIPE_LOOKUP, DEFAULT_HOSTS
 
 class ConfigManger:
+    """
+    Keeps an in-memory snapshot of `inf_config.json` shared by every instance,
+    the file is only read again when its mtime changes.
+    Use `add_listener` to get notified when the config changes instead of polling it.
+    """
+
+    # shared across instances so every part of the app sees the same snapshot
+    _config: dict | None = None
+    _mtime: float | None = None
+    _listeners: list[Callable[[dict], None]] = []
+    _lock = threading.RLock()
 
     def __init__(self) -> None:
         self.file = "inf_config.json"
@@ -10,43 +22,115 @@ class ConfigManger:
 
     def init_file(self):
         if not os.path.exists(self.file):
-            with open(self.file, "w") as f:
-                json.dump({
-                    "base_url": DEFAULT_BASE_URL,
-                    "system_msg": DEFAULT_SYSTEM_MSG
-                }, f, indent=4)
-            return
-        
-        with open(self.file, "r") as f:
-            config = json.load(f)
-            if "base_url" not in config:
-                config["base_url"] = DEFAULT_BASE_URL
-            if "system_msg" not in config:
-                config["system_msg"] = DEFAULT_SYSTEM_MSG
-            if "model" not in config:
-                config["model"] = DEFAULT_MODEL
-            if "examples" not in config:
-                config["examples"] = DEFAULT_EXAMPLES
-            if "default_chips" not in config:
-                config["default_chips"] = DEFAULT_CHIPS
-            self.set_config(config)
+            config = {}
+        else:
+            with open(self.file, "r") as f:
+                config = json.load(f)
+
+        if "base_url" not in config:
+            config["base_url"] = DEFAULT_BASE_URL
+        if "system_msg" not in config:
+            config["system_msg"] = DEFAULT_SYSTEM_MSG
+        if "model" not in config:
+            config["model"] = DEFAULT_MODEL
+        if "examples" not in config:
+            config["examples"] = DEFAULT_EXAMPLES
+        if "default_chips" not in config:
+            config["default_chips"] = DEFAULT_CHIPS
+        if "cache_size" not in config:
+            config["cache_size"] = DEFAULT_CACHE_SIZE
+        if "max_concurrent_requests" not in config:
+            config["max_concurrent_requests"] = DEFAULT_MAX_CONCURRENT_REQUESTS
+        if "request_timeout" not in config:
+            config["request_timeout"] = DEFAULT_REQUEST_TIMEOUT
+        if "max_connections_per_host" not in config:
+            config["max_connections_per_host"] = DEFAULT_MAX_CONNECTIONS_PER_HOST
+        if "stream" not in config:
+            config["stream"] = DEFAULT_STREAM
+        if "keep_alive" not in config:
+            config["keep_alive"] = DEFAULT_KEEP_ALIVE
+        if "num_ctx" not in config:
+            config["num_ctx"] = DEFAULT_NUM_CTX
+        if "prefetch_enabled" not in config:
+            config["prefetch_enabled"] = DEFAULT_PREFETCH_ENABLED
+        if "prefetch_per_minute" not in config:
+            config["prefetch_per_minute"] = DEFAULT_PREFETCH_PER_MINUTE
+        if "prefetch_recent_chips" not in config:
+            config["prefetch_recent_chips"] = DEFAULT_PREFETCH_RECENT_CHIPS
+        if "viewport_update_mode" not in config:
+            config["viewport_update_mode"] = DEFAULT_VIEWPORT_UPDATE_MODE
+        if "recipe_lookup" not in config:
+            config["recipe_lookup"] = DEFAULT_RECIPE_LOOKUP
+        if "hosts" not in config:
+            config["hosts"] = DEFAULT_HOSTS
+
+        with ConfigManger._lock:
+            if ConfigManger._config != config:
+                self.set_config(config)
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """`callback` is called with a copy of the new config every time it changes"""
+        with ConfigManger._lock:
+            ConfigManger._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[dict], None]):
+        with ConfigManger._lock:
+            if callback in ConfigManger._listeners:
+                ConfigManger._listeners.remove(callback)
+
+    def __file_mtime(self) -> float | None:
+        try:
+            return os.stat(self.file).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def __snapshot(self) -> dict:
+        with ConfigManger._lock:
+            mtime = self.__file_mtime()
+            if ConfigManger._config is not None and mtime == ConfigManger._mtime:
+                return ConfigManger._config
+
+            # edited outside of the app (or first load)
+            with open(self.file, "r") as f:
+                config = json.load(f)
+            changed = ConfigManger._config is not None
+            ConfigManger._config = config
+            ConfigManger._mtime = mtime
+
+        if changed:
+            self.__notify(config)
+        return config
+
+    def __notify(self, config: dict):
+        with ConfigManger._lock:
+            listeners = list(ConfigManger._listeners)
+        for callback in listeners:
+            callback(copy.deepcopy(config))
+
+    def reload_if_changed(self):
+        """Only an `os.stat` when nothing changed, otherwise the file is read and the listeners are notified"""
+        self.__snapshot()
 
     def get_config(self):
-        with open(self.file, "r") as f:
-            return json.load(f)
-        
+        return copy.deepcopy(self.__snapshot())
+
     def set_config(self, config):
-        with open(self.file, "w") as f:
-            json.dump(config, f, indent=4, )
+        config = copy.deepcopy(config)
+        with ConfigManger._lock:
+            with open(self.file, "w") as f:
+                json.dump(config, f, indent=4, )
+            ConfigManger._config = config
+            ConfigManger._mtime = self.__file_mtime()
+        self.__notify(config)
 
     def get_value(self, key):
-        config = self.get_config()
-        return config[key]
-    
+        return copy.deepcopy(self.__snapshot()[key])
+
     def set_key_value(self, key, value):
-        config = self.get_config()
-        config[key] = value
-        self.set_config(config)
+        with ConfigManger._lock:
+            config = copy.deepcopy(self.__snapshot())
+            config[key] = value
+            self.set_config(config)
 
     def set_base_url(self, url):
         self.set_key_value("base_url", url)
@@ -47,4 +47,44 @@ DEFAULT_CHIPS = [
     "🔥 Fire",
 ]
 
-DEFAULT_MODEL = "llama2"
\ No newline at end of file
+DEFAULT_MODEL = "llama2"
+
+DEFAULT_CACHE_SIZE = 5000
+
+# per host, the limit grows with the number of hosts
+DEFAULT_MAX_CONCURRENT_REQUESTS = 2
+
+# seconds
+DEFAULT_REQUEST_TIMEOUT = 120
+
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+
+DEFAULT_STREAM = True
+
+# how long ollama keeps the model, and with it the cached prompt prefix, loaded after a merge
+DEFAULT_KEEP_ALIVE = "30m"
+
+# changing the context size reloads the model on the server, so it is kept fixed
+DEFAULT_NUM_CTX = 2048
+
+DEFAULT_PREFETCH_ENABLED = False
+
+DEFAULT_PREFETCH_PER_MINUTE = 6
+
+DEFAULT_PREFETCH_RECENT_CHIPS = 5
+
+# one of minimal, bounding_rect, smart or full
+DEFAULT_VIEWPORT_UPDATE_MODE = "minimal"
+
+# answer pairs already in the recipe store without asking the model
+DEFAULT_RECIPE_LOOKUP = True
+
+# ollama servers merges are spread over, empty to only use base_url
+DEFAULT_HOSTS = []
+
+# asked when the answer to the full prompt had no usable "emoji Text" in it
+RETRY_SYSTEM_MSG = """Combine the two items into one new item.
+Answer with one emoji followed by one to three words, for example: 🌱 Plant
+No quotes, no explanation, nothing else."""
+
+RETRY_MAX_TOKENS = 16
@@ -0,0 +1,36 @@
+import asyncio, threading
+from concurrent.futures import Future
+from typing import Coroutine
+
+
+class AsyncLoopThread:
+    """
+    Runs an asyncio event loop in a daemon thread,
+    the GUI thread hands coroutines to it with `submit`.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.__run, name="infinite-sides-loop", daemon=True)
+        self.thread.start()
+
+    def __run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+
+_shared_loop: AsyncLoopThread | None = None
+_shared_lock = threading.Lock()
+
+def shared_loop() -> AsyncLoopThread:
+    global _shared_loop
+    with _shared_lock:
+        if _shared_loop is None:
+            _shared_loop = AsyncLoopThread()
+        return _shared_loop
@@ -0,0 +1,113 @@
+import json, os
+from typing import Iterator
+
+# journal entries after which the snapshot is rewritten and the journal emptied
+COMPACT_EVERY = 500
+
+
+def atomic_write_json(file: str, data):
+    """Writes to a temporary file first and swaps it in, a crash never leaves a half written file behind"""
+    tmp_file = file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file)
+
+
+class GameSave:
+    """
+    Discovered chips stored as a JSON snapshot (the old `game-data.json` format)
+    plus an append-only journal with one discovery per line.
+    A discovery costs one small append, the journal is folded into the snapshot every `COMPACT_EVERY` entries.
+    """
+
+    def __init__(self, file: str = "./game-data.json") -> None:
+        self.file = file
+        self.journal_file = os.path.splitext(file)[0] + ".journal"
+        self.chips: list[str] = []
+        self.journal_size = 0
+        # compacting before the save is fully read would drop chips
+        self.loaded = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.file) or os.path.exists(self.journal_file)
+
+    def iter_batches(self, batch_size: int = 500) -> Iterator[tuple[list[str], int]]:
+        """
+        Yields the saved chips in batches together with the total number of chips,
+        so a large save can be shown while it is still being read.
+        """
+        snapshot = []
+        if os.path.exists(self.file):
+            with open(self.file, "r", encoding="utf-8") as f:
+                snapshot = json.load(f) or []
+
+        lines = []
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+
+        total = len(snapshot) + len(lines)
+        # chips discovered while loading are appended to self.chips meanwhile
+        self.chips = []
+        chips = []
+        for start in range(0, len(snapshot), batch_size):
+            batch = snapshot[start:start + batch_size]
+            chips.extend(batch)
+            yield batch, total
+
+        self.journal_size = 0
+        torn = False
+        batch = []
+        for line in lines:
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                # cut off by a crash while appending
+                torn = True
+                continue
+            self.journal_size += 1
+            if len(batch) >= batch_size:
+                chips.extend(batch)
+                yield batch, total
+                batch = []
+        if batch:
+            chips.extend(batch)
+            yield batch, total
+
+        self.chips = chips + self.chips
+        self.loaded = True
+        if torn:
+            # the next append would otherwise end up on the broken line
+            self.compact()
+
+    def load(self) -> list[str]:
+        for _ in self.iter_batches():
+            pass
+        return self.chips
+
+    def append(self, text: str):
+        self.chips.append(text)
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(text, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_size += 1
+
+        if self.journal_size >= COMPACT_EVERY:
+            self.compact()
+
+    def write_snapshot(self, chips: list[str]):
+        self.chips = list(chips)
+        self.loaded = True
+        self.compact()
+
+    def compact(self):
+        if not self.loaded:
+            return
+        atomic_write_json(self.file, self.chips)
+        # the snapshot has everything now, the journal can start over
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self.journal_size = 0
@@ -1,17 +1,32 @@
-from typing import Literal
+import json, os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, TYPE_CHECKING
 
 from PySide6.QtWidgets import (
     QGraphicsView, 
     QGraphicsScene,
 )
 
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 from PySide6.QtGui import QPainter
-from generate_task import GenerateTask
-from chip_widget import Chip, ChipGraphicsItem
+from chip_widget import ChipGraphicsItem
+from configmanager import ConfigManger
+from game_save import atomic_write_json
+from perf import metrics
+from perf_panel import PerfPanel
+
+if TYPE_CHECKING:
+    from generate_task import GenerateTask, MergeScheduler
 
 ThemeLiteral = Literal["dark"] | Literal["light"]
 
+VIEWPORT_UPDATE_MODES = {
+    "minimal": QGraphicsView.ViewportUpdateMode.MinimalViewportUpdate,
+    "bounding_rect": QGraphicsView.ViewportUpdateMode.BoundingRectViewportUpdate,
+    "smart": QGraphicsView.ViewportUpdateMode.SmartViewportUpdate,
+    "full": QGraphicsView.ViewportUpdateMode.FullViewportUpdate,
+}
+
 class GameView(QGraphicsView):
 
     chip_connected = Signal(ChipGraphicsItem, ChipGraphicsItem)
@@ -25,7 +40,10 @@ class GameView(QGraphicsView):
         self.setAcceptDrops(True)
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
         self.setDragMode(QGraphicsView.DragMode.RubberBandDrag)
-        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.FullViewportUpdate)
+        # chips cache their own rendering, so only the parts of the viewport that changed are repainted
+        update_mode = ConfigManger().get_value("viewport_update_mode")
+        self.setViewportUpdateMode(VIEWPORT_UPDATE_MODES.get(update_mode, QGraphicsView.ViewportUpdateMode.MinimalViewportUpdate))
+        self.setOptimizationFlag(QGraphicsView.OptimizationFlag.DontSavePainterState)
 
 
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
@@ -36,31 +54,128 @@ class GameView(QGraphicsView):
 
         self.chips = []
 
-        self.task = GenerateTask()      
-        self.task.finished.connect(self.generate_finished)
+        # chip text, position and z-order of everything on the canvas
+        self.canvas_file = "./canvas-data.json"
+        self.__saved_canvas: list | None = None
+        # one writer so snapshots never race each other
+        self.__canvas_writer = ThreadPoolExecutor(max_workers=1)
+        # written a moment after the canvas stops changing, not on every change
+        self.canvas_save_timer = QTimer(self)
+        self.canvas_save_timer.setSingleShot(True)
+        self.canvas_save_timer.setInterval(2000)
+        self.canvas_save_timer.timeout.connect(self.save_canvas)
+        self.sc.changed.connect(self.schedule_canvas_save)
+
+        # the scheduler brings in ollama, httpx and the backend, it is created on the first merge
+        self.__scheduler: "MergeScheduler | None" = None
         self.chip_connected.connect(self.chip_connect)
+        self.perf_panel = PerfPanel(self)
+
+    @property
+    def scheduler(self) -> "MergeScheduler":
+        if self.__scheduler is None:
+            from generate_task import MergeScheduler
+            self.__scheduler = MergeScheduler()
+            self.__scheduler.finished.connect(self.generate_finished)
+            self.__scheduler.progress.connect(self.generate_progress)
+        return self.__scheduler
+
+    def schedule_canvas_save(self, *args):
+        self.canvas_save_timer.start()
+
+    def canvas_state(self) -> list:
+        return [
+            [chip.toPlainText(), round(chip.x(), 1), round(chip.y(), 1), chip.zValue()]
+            for chip in self.chips
+        ]
+
+    def save_canvas(self, background: bool = True):
+        if not background:
+            self.canvas_save_timer.stop()
+        state = self.canvas_state()
+        if state == self.__saved_canvas:
+            return
+        self.__saved_canvas = state
+
+        if background:
+            self.__canvas_writer.submit(atomic_write_json, self.canvas_file, state)
+        else:
+            self.__canvas_writer.shutdown(wait=True)
+            atomic_write_json(self.canvas_file, state)
+
+    def restore_canvas(self):
+        if not os.path.exists(self.canvas_file):
+            return
+        try:
+            with open(self.canvas_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            self.main_window.show_error(f"Could not restore the canvas: {e}")
+            return
 
-    def add_chip(self, w: Chip):
-        chip = ChipGraphicsItem(w.text(), self.theme)    
+        for text, x, y, z in state:
+            chip = ChipGraphicsItem(text, self.theme)
+            chip.setPos(x, y)
+            chip.setZValue(z)
+            self.sc.addItem(chip)
+            self.chips.append(chip)
+        self.__saved_canvas = state
+
+    def clear(self):
+        # the merges still running would finish for chips that no longer exist
+        if self.__scheduler is not None:
+            self.__scheduler.cancel_all()
+        self.sc.clear()
+        self.chips.clear()
+
+    def add_chip(self, text: str):
+        chip = ChipGraphicsItem(text, self.theme)    
         self.sc.addItem(chip)  
         self.chips.append(chip)
 
     def chip_connect(self, chip1, chip2, debug=False):
         text1 = chip1.toPlainText()
         text2 = chip2.toPlainText()
+        if chip1.loading or chip2.loading:
+            # already part of a merge that is still running
+            return
+
         chip1.loading = True
         chip2.loading = True
+        self.scheduler.prefetcher.use(text1)
+        self.scheduler.prefetcher.use(text2)
         
         if debug:
             print("Generting for", text1, text2)       
             
-        self.task.update_text(chip1, chip2)
-        self.task.start()
+        self.scheduler.submit(chip1, chip2)
+
+    def generate_progress(self, task: "GenerateTask", partial: str):
+        if task.cancelled:
+            return
+        task.chip2.partial_text = partial.strip().strip('"')
+
+    def paintEvent(self, event):
+        with metrics.timed("game.scene_paint_ms"):
+            super().paintEvent(event)
+
+    def generate_finished(self, task: "GenerateTask"):
+        with metrics.timed("game.generate_finished_ms"):
+            self.__generate_finished(task)
+
+    def __generate_finished(self, task: "GenerateTask"):
+        chip1: ChipGraphicsItem = task.chip1
+        chip2: ChipGraphicsItem = task.chip2
+        result = task.result
+        err_msg = task.err_msg
+
+        if task.cancelled:
+            # dropped by `clear`, its chips may already be deleted
+            return
 
-    def generate_finished(self, chip1: ChipGraphicsItem, chip2: ChipGraphicsItem, result: str, err_msg: str):
-        
         chip1.loading = False
         chip2.loading = False
+        chip2.partial_text = ""
 
         if err_msg:
             self.main_window.show_error(err_msg)
@@ -77,15 +192,12 @@ class GameView(QGraphicsView):
         chip.setPos(scene_pos)
         self.sc.addItem(chip)  
         self.chips.append(chip)
+        self.scheduler.prefetcher.discovered(result)
+        self.scheduler.llm.recipes.record(task.first, task.second, task.model, result)
 
         # check if chip with text already exists or not
-        for idx in range(self.main_window.chips_list.count()):
-            item = self.main_window.chips_list.item(idx)
-            # get the widget from QListWidgetItem
-            widget = self.main_window.chips_list.itemWidget(item)
-            if widget.text() == result:
-                return
-
-        chip = Chip(result, self.add_chip, self.theme)
-        self.main_window.chips_list.add_chip(chip)  
-        self.main_window.save_chips()
\ No newline at end of file
+        if self.main_window.chips_list.contains(result):
+            return
+
+        self.main_window.chips_list.add_chip(result)
+        self.main_window.save_chip(result)
\ No newline at end of file
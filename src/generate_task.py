@@ -1,31 +1,190 @@
+import asyncio
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+
 from PySide6.QtWidgets import QGraphicsTextItem
-from PySide6.QtCore import Signal, QThread
-from backend import BackendLLM
+from PySide6.QtCore import Signal, QObject
+from backend import shared_backend
+from configmanager import ConfigManger
+from consts import DEFAULT_MAX_CONCURRENT_REQUESTS
+from event_loop import shared_loop
+from prefetcher import Prefetcher
+from perf import metrics
+
+# merges the player is waiting for
+INTERACTIVE = 0
+# prefetching, only runs when no interactive merge is waiting and gives its slot up to one
+BACKGROUND = 1
+
+
+class GenerateTask:
+    """
+    A single merge job, it carries its own chip pair
+    so jobs running at the same time never mix up their chips.
+    """
+
+    def __init__(self, chip1: QGraphicsTextItem, chip2: QGraphicsTextItem) -> None:
+        self.chip1 = chip1
+        self.chip2 = chip2
+        # read on the GUI thread, chips must not be touched from the worker
+        self.first = chip1.toPlainText() if chip1 else ""
+        self.second = chip2.toPlainText() if chip2 else ""
+        self.result = ""
+        self.err_msg: str | None = None
+        # model that generated the result
+        self.model = ""
+        # set by the scheduler, cancelling it aborts the request
+        self.future: Future | None = None
+        # a result that was already on its way to the GUI thread must be ignored
+        self.cancelled = False
 
 
-class GenerateTask(QThread):
+class MergeScheduler(QObject):
+    """
+    Runs merge jobs on the shared event loop with at most `max_concurrent_requests`
+    Ollama requests in flight per host, results are delivered back on the GUI thread through `finished`.
+    Interactive merges go before background work, a cancelled merge aborts its request and emits nothing.
+    """
 
-    finished = Signal(QGraphicsTextItem, QGraphicsTextItem, str, str)
+    finished = Signal(object)
+    # partial completion of a streaming merge
+    progress = Signal(object, str)
 
     def __init__(self) -> None:
         super().__init__()
-        self.chip1 = None
-        self.chip2 = None
-        self.llm = BackendLLM()
+        self.llm = shared_backend()
+        self.loop = shared_loop()
+        self.conf_manager = ConfigManger()
+        self.max_in_flight: int = self.conf_manager.get_value("max_concurrent_requests")
+        self.in_flight = 0
+        # interactive merges waiting for a slot
+        self.waiting = 0
+        self.__slot_free: asyncio.Condition | None = None
+        # background jobs holding a slot, only touched on the loop thread
+        self.__background: set[asyncio.Future] = set()
+        # merges whose `finished` the GUI thread hasn't handled yet, only touched on the GUI thread.
+        # A task stays here after its future is done, its queued signals still point at the chips
+        self.__tasks: set[GenerateTask] = set()
+        # queued like every other `finished` connection, connected first so it runs before them
+        self.finished.connect(self.__forget)
+        self.conf_manager.add_listener(self.on_config_changed)
+        self.prefetcher = Prefetcher(self.llm, self.loop, self.wait_idle, self.run_background)
 
-    def update_text(self, chip1: QGraphicsTextItem, chip2: QGraphicsTextItem):
-        self.chip1 = chip1
-        self.chip2 = chip2
+    def on_config_changed(self, conf: dict):
+        max_in_flight = conf.get("max_concurrent_requests", DEFAULT_MAX_CONCURRENT_REQUESTS)
+        if max_in_flight != self.max_in_flight:
+            self.loop.call_soon(self.__set_max_in_flight, max_in_flight)
 
-    def run(self):
-        if not self.chip1 and not self.chip2:
-            self.finished.emit(self.chip1, self.chip2, "", "Generate task got invalid or no text")
-            
-        result, err = self.llm.generate_result(self.chip1.toPlainText(), self.chip2.toPlainText())
-        
-        if err:
-            self.finished.emit(self.chip1, self.chip2, "", err)
+    def __set_max_in_flight(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.loop.submit(self.__notify_slots())
+
+    async def __notify_slots(self):
+        slot_free = self.__get_slot_free()
+        async with slot_free:
+            slot_free.notify_all()
+
+    def __get_slot_free(self) -> asyncio.Condition:
+        # must be created on the loop thread
+        if self.__slot_free is None:
+            self.__slot_free = asyncio.Condition()
+        return self.__slot_free
+
+    async def wait_idle(self):
+        """Returns once no merge is waiting or running, used to keep background work out of the way"""
+        slot_free = self.__get_slot_free()
+        async with slot_free:
+            await slot_free.wait_for(lambda: self.in_flight == 0 and self.waiting == 0)
+
+    def __has_free_slot(self) -> bool:
+        return self.in_flight < max(1, self.max_in_flight) * self.llm.pool.size()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE):
+        """Holds one of the request slots, background work waits until no interactive merge does"""
+        slot_free = self.__get_slot_free()
+        async with slot_free:
+            if priority == INTERACTIVE:
+                self.waiting += 1
+                if not self.__has_free_slot():
+                    self.__preempt_background()
+            try:
+                await slot_free.wait_for(lambda: self.__has_free_slot() and (priority == INTERACTIVE or self.waiting == 0))
+            finally:
+                if priority == INTERACTIVE:
+                    self.waiting -= 1
+            self.in_flight += 1
+
+        try:
+            yield
+        finally:
+            async with slot_free:
+                self.in_flight -= 1
+                slot_free.notify_all()
+
+    def __preempt_background(self):
+        for job in self.__background:
+            if not job.done():
+                metrics.increment("scheduler.preempted")
+                job.cancel()
+
+    async def run_background(self, first: str, second: str) -> bool:
+        """Generates a pair with background priority, returns False when an interactive merge took its slot over"""
+        job = asyncio.ensure_future(self.llm.generate_result(first, second, slot=lambda: self.slot(BACKGROUND)))
+        self.__background.add(job)
+        try:
+            await asyncio.wait([job])
+        finally:
+            self.__background.discard(job)
+            job.cancel()
+        if job.cancelled():
+            return False
+        job.result()
+        return True
+
+    def submit(self, chip1: QGraphicsTextItem, chip2: QGraphicsTextItem) -> GenerateTask:
+        task = GenerateTask(chip1, chip2)
+        self.__tasks.add(task)
+        task.future = self.loop.submit(self.__run(task))
+        return task
+
+    def __forget(self, task: GenerateTask):
+        self.__tasks.discard(task)
+
+    def cancel(self, task: GenerateTask):
+        """Drops a merge and aborts its request, called on the GUI thread before its chips are deleted"""
+        task.cancelled = True
+        if task.future is not None and task.future.cancel():
+            metrics.increment("scheduler.cancelled")
+        self.__forget(task)
+        for chip in (task.chip1, task.chip2):
+            if chip is not None and chip.scene() is not None:
+                chip.loading = False
+                chip.partial_text = ""
+
+    def cancel_all(self):
+        for task in list(self.__tasks):
+            self.cancel(task)
+
+    async def __run(self, task: GenerateTask):
+        if not task.first or not task.second:
+            task.err_msg = "Generate task got invalid or no text"
+            self.finished.emit(task)
             return
 
-        self.finished.emit(self.chip1, self.chip2, result.strip(), err)
-        return True
\ No newline at end of file
+        try:
+            result, err = await self.llm.generate_result(
+                task.first,
+                task.second,
+                on_token=lambda partial: self.progress.emit(task, partial),
+                slot=lambda: self.slot(INTERACTIVE),
+            )
+        except Exception as e:
+            result, err = None, str(e)
+
+        if err:
+            task.err_msg = err
+        else:
+            task.result = result.strip()
+            task.model = self.llm.model
+        self.finished.emit(task)
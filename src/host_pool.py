@@ -0,0 +1,147 @@
+import asyncio, time
+import httpx
+from ollama import AsyncClient, ResponseError
+from perf import metrics
+
+# seconds between two health checks of every host
+HEALTH_CHECK_INTERVAL = 30
+HEALTH_CHECK_TIMEOUT = 5
+# weight of the latest request in a host's average latency
+LATENCY_SMOOTHING = 0.3
+
+
+def normalize_host(url: str) -> str:
+    url = url.strip()
+    if url.endswith("/v1"):
+        return url
+    if url.endswith("/"):
+        return url + "v1"
+    return url + "/v1"
+
+
+class Host:
+    """One Ollama server with its own connection pool and load figures"""
+
+    def __init__(self, url: str, client: AsyncClient) -> None:
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        # smoothed, 0 until the first request finished
+        self.latency_ms = 0.0
+        self.healthy = True
+        self.ejected_at = 0.0
+
+    def expected_wait(self) -> float:
+        # hosts without a measured latency are tried first
+        return (self.outstanding + 1) * self.latency_ms
+
+
+class HostPool:
+    """
+    Spreads requests over several Ollama hosts. A request goes to the healthy host with the
+    lowest expected wait (requests in flight times average latency), a host that fails is
+    ejected until a health check through `/api/tags` succeeds again.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self) -> None:
+        self.hosts: list[Host] = []
+        self.__settings: tuple | None = None
+        self.__configured: tuple | None = None
+        self.__stale_clients: list[AsyncClient] = []
+        self.__health_task: asyncio.Task | None = None
+
+    def configure(self, urls: list[str], timeout: float, max_connections: int):
+        """The clients are rebuilt on the next `ready()`, and only when something changed"""
+        self.__settings = (tuple(normalize_host(url) for url in urls), timeout, max_connections)
+
+    async def ready(self):
+        if self.__settings != self.__configured:
+            self.__build()
+
+        # close pools of clients replaced by a settings change
+        while self.__stale_clients:
+            await self.__stale_clients.pop()._client.aclose()
+
+        if self.__health_task is None or self.__health_task.done():
+            self.__health_task = asyncio.get_running_loop().create_task(self.__health_checks())
+
+    def __build(self):
+        urls, timeout, max_connections = self.__settings
+        self.__stale_clients.extend(host.client for host in self.hosts)
+        # created here, httpx binds the pool to the loop it is first used on
+        self.hosts = [
+            Host(url, AsyncClient(
+                host=url,
+                timeout=httpx.Timeout(timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            ))
+            for url in urls
+        ]
+        self.__configured = self.__settings
+
+    def size(self) -> int:
+        return max(1, len(self.__settings[0]) if self.__settings else 0)
+
+    def acquire(self, exclude: list[Host] = ()) -> Host | None:
+        """Picks a host for one request, every `acquire` must be paired with a `release`"""
+        candidates = [host for host in self.hosts if host not in exclude]
+        if not candidates:
+            return None
+
+        healthy = [host for host in candidates if host.healthy]
+        if healthy:
+            host = min(healthy, key=lambda host: (host.expected_wait(), host.outstanding))
+        else:
+            # everything is down, try the host that was ejected the longest ago rather than failing outright
+            host = min(candidates, key=lambda host: host.ejected_at)
+        host.outstanding += 1
+        return host
+
+    def release(self, host: Host, latency_ms: float | None = None, failed: bool = False):
+        host.outstanding -= 1
+        if failed:
+            self.eject(host)
+            return
+
+        host.healthy = True
+        if latency_ms is not None:
+            if host.latency_ms:
+                host.latency_ms += LATENCY_SMOOTHING * (latency_ms - host.latency_ms)
+            else:
+                host.latency_ms = latency_ms
+
+    def eject(self, host: Host):
+        if host.healthy:
+            metrics.increment("backend.host_ejections")
+        host.healthy = False
+        host.ejected_at = time.monotonic()
+
+    async def __health_checks(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            await self.check_health()
+
+    async def check_health(self):
+        await asyncio.gather(*(self.__check(host) for host in list(self.hosts)))
+
+    async def __check(self, host: Host):
+        try:
+            await asyncio.wait_for(host.client.list(), HEALTH_CHECK_TIMEOUT)
+        except (httpx.HTTPError, ResponseError, asyncio.TimeoutError):
+            self.eject(host)
+            return
+        host.healthy = True
+
+    async def close(self):
+        if self.__health_task is not None:
+            self.__health_task.cancel()
+            self.__health_task = None
+        self.__stale_clients.extend(host.client for host in self.hosts)
+        self.hosts = []
+        self.__configured = None
+        while self.__stale_clients:
+            await self.__stale_clients.pop()._client.aclose()
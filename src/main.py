@@ -1,3 +1,6 @@
+import time
+START_TIME = time.perf_counter()
+
 from typing import Literal
 import sys, os, json
 
@@ -7,35 +10,80 @@ from PySide6.QtWidgets import (
     QMainWindow, 
     QHBoxLayout,
     QFrame,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
     QAbstractItemView,
     QLineEdit,
     QPushButton,
     QDialog,
     QMessageBox,
-    QLabel
+    QLabel,
+    QProgressBar,
+    QFileDialog,
 )
 
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal, QTimer
+from PySide6.QtGui import QMouseEvent
 import qdarkstyle
 
-from chip_widget import Chip
+from chip_widget import ChipListModel, ChipDelegate
+from game_save import GameSave
+from save_loader import SaveLoader
+# settings pulls in ollama and httpx, it is only imported once the dialog is opened
 from game_view import GameView
-from settings import Settings
+from perf import metrics
 
 from configmanager import ConfigManger
 
 from consts import DEFAULT_CHIPS
 
-class ChipList(QListWidget):
+class ChipList(QListView):
+
+    chip_clicked = Signal(str)
+
+    def __init__(self, theme) -> None:
+        super().__init__()
+        self.chip_model = ChipListModel(self)
+        self.delegate = ChipDelegate(theme, self)
+        self.setModel(self.chip_model)
+        self.setItemDelegate(self.delegate)
+        # lay out large lists in batches so the window stays responsive
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(200)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.viewport().setCursor(Qt.PointingHandCursor)
+
+    def add_chip(self, text: str):
+        self.chip_model.add_chip(text)
+
+    def add_chips(self, texts: list[str]):
+        self.chip_model.add_chips(texts)
+
+    def contains(self, text: str) -> bool:
+        return self.chip_model.contains(text)
+
+    def set_filter(self, query: str):
+        self.chip_model.set_filter(query)
+
+    def texts(self) -> list[str]:
+        return self.chip_model.texts()
 
-    def add_chip(self, chip: Chip):
-        item = QListWidgetItem()
-        item.setSizeHint(chip.sizeHint())  
-        item.setFlags(Qt.NoItemFlags)
-        self.addItem(item)
-        self.setItemWidget(item, chip)
+    def count(self) -> int:
+        return self.chip_model.chip_count()
+
+    def clear(self):
+        self.chip_model.clear()
+
+    def set_theme(self, theme):
+        self.delegate.theme = theme
+        self.viewport().update()
+
+    def mousePressEvent(self, ev: QMouseEvent) -> None:
+        super().mousePressEvent(ev)
+
+        if ev.button() == Qt.LeftButton:
+            index = self.indexAt(ev.position().toPoint())
+            if index.isValid():
+                self.chip_clicked.emit(index.data(Qt.DisplayRole))
 
 
 class MainWindow(QMainWindow):
@@ -52,6 +100,8 @@ class MainWindow(QMainWindow):
 
         # Game
         self.game_file = "./game-data.json"     
+        self.game_save = GameSave(self.game_file)
+        self.save_loader: SaveLoader | None = None
 
         self.frame = QFrame()
         
@@ -66,7 +116,7 @@ class MainWindow(QMainWindow):
         
         clear_btn = QPushButton("Clear")
         clear_btn.setMinimumHeight(30)
-        clear_btn.clicked.connect(self.game_view.sc.clear)
+        clear_btn.clicked.connect(self.game_view.clear)
         reset_btn = QPushButton("Reset")
         reset_btn.setMinimumHeight(30)
         reset_btn.clicked.connect(self.reset_chip_list)
@@ -76,9 +126,10 @@ class MainWindow(QMainWindow):
         btn_group.addWidget(reset_btn)
 
 
-        self.chips_list = ChipList()
+        self.chips_list = ChipList(self.theme)
+        self.chips_list.chip_clicked.connect(self.game_view.add_chip)
         self.chips_list.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
-        self.chips_list.setFlow(QListWidget.Flow.LeftToRight)
+        self.chips_list.setFlow(QListView.Flow.LeftToRight)
         self.chips_list.setWrapping(True)
         self.chips_list.setMaximumWidth(250)
         self.chips_list.setSpacing(5)
@@ -87,13 +138,27 @@ class MainWindow(QMainWindow):
         self.search_bar.setPlaceholderText("Search")
         self.search_bar.setMaximumWidth(250)
         self.search_bar.setMinimumHeight(40)
-        self.search_bar.textChanged.connect(self.filterItems)
+        # filter once typing pauses instead of on every keystroke
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.filterItems)
+        self.search_bar.textChanged.connect(self.filter_timer.start)
+
+        self.loading_pb = QProgressBar()
+        self.loading_pb.setMaximumWidth(250)
+        self.loading_pb.setMaximumHeight(20)
+        self.loading_pb.setFormat("Loading chips %v/%m")
+        self.loading_pb.hide()
 
         self.sidebar.addLayout(btn_group)
         self.sidebar.addWidget(self.chips_list)
+        self.sidebar.addWidget(self.loading_pb)
         self.sidebar.addWidget(self.search_bar)
 
-        self.load_game_data()
+        # the save is read once the window is up, so large saves don't delay the first frame
+        QTimer.singleShot(0, self.load_game_data)
+        QTimer.singleShot(0, self.game_view.restore_canvas)
 
         self.lay.addLayout(self.sidebar)
         self.setCentralWidget(self.frame)
@@ -101,7 +166,7 @@ class MainWindow(QMainWindow):
         self.init_menu()
 
     def load_game_data(self):
-        if os.path.exists(self.game_file):
+        if self.game_save.exists():
             self.load_chips()
             return
 
@@ -109,41 +174,69 @@ class MainWindow(QMainWindow):
         self.save_chips()
 
     def load_chips(self):
-        with open(self.game_file, "r") as f:
-            data = json.load(f)
-            if not data:
-                self.populate_default_chips()
-                return
-            
-            for chip in data:
-                chip = Chip(chip, self.game_view.add_chip, self.theme)
-                self.chips_list.add_chip(chip)
+        self.loading_pb.setRange(0, 0)
+        self.loading_pb.show()
+
+        self.save_loader = SaveLoader(self.game_save)
+        self.save_loader.batch_loaded.connect(self.load_chips_batch)
+        self.save_loader.error.connect(self.show_error)
+        self.save_loader.finished.connect(self.load_chips_finished)
+        self.save_loader.start()
+
+    def load_chips_batch(self, chips: list[str], loaded: int, total: int):
+        if self.save_loader is None:
+            # loading was stopped by a reset
+            return
+        self.chips_list.add_chips(chips)
+        self.loading_pb.setRange(0, total)
+        self.loading_pb.setValue(loaded)
 
-    def save_chips(self):
-        chips = []
-        for idx in range(self.chips_list.count()):
-            item = self.chips_list.item(idx)
-            widget = self.chips_list.itemWidget(item)
-            chips.append(widget.text())
+    def load_chips_finished(self):
+        if self.save_loader is None:
+            return
+        failed = self.save_loader.failed
+        self.save_loader = None
+        self.loading_pb.hide()
 
-        with open(self.game_file, "w") as f:
-            json.dump(chips, f)
+        if failed:
+            # keep the unreadable save as it is, writing the defaults would replace it
+            return
+        if not self.chips_list.count():
+            self.populate_default_chips()
+            self.save_chips()
+
+    def stop_loading(self):
+        if self.save_loader is None:
+            return
+        loader = self.save_loader
+        self.save_loader = None
+        loader.requestInterruption()
+        loader.wait()
+        self.loading_pb.hide()
+
+    def save_chips(self):
+        """Rewrites the whole save, use `save_chip` for a single discovery"""
+        with metrics.timed("game.save_ms"):
+            self.game_save.write_snapshot(self.chips_list.texts())
+
+    def save_chip(self, text: str):
+        with metrics.timed("game.save_ms"):
+            self.game_save.append(text)
+
+    def closeEvent(self, event):
+        # an unfinished load leaves the save as it is, compacting now would drop the unread chips
+        self.stop_loading()
+        self.game_view.save_canvas(background=False)
+        if self.game_save.journal_size:
+            self.game_save.compact()
+        super().closeEvent(event)
 
     def populate_default_chips(self):
         chips = self.conf_manager.get_value("default_chips")
-        for chip in chips:
-            c = Chip(chip, self.game_view.add_chip, self.theme)
-            self.chips_list.add_chip(c)
+        self.chips_list.add_chips(chips)
 
     def filterItems(self):
-        search_text = self.search_bar.text()
-        for idx in range(self.chips_list.count()):
-            item = self.chips_list.item(idx)
-            widget = self.chips_list.itemWidget(item)
-            if search_text.lower() in widget.text().lower():
-                item.setHidden(False)
-            else:
-                item.setHidden(True)
+        self.chips_list.set_filter(self.search_bar.text())
         
         self.game_view.update()
 
@@ -151,6 +244,7 @@ class MainWindow(QMainWindow):
         menu = self.menuBar()
         app_menu = menu.addMenu("App")
         theme_menu = menu.addMenu("Theme")
+        view_menu = menu.addMenu("View")
 
         # App menu
         settings_window_action = app_menu.addAction("Settings")
@@ -166,12 +260,41 @@ class MainWindow(QMainWindow):
         light_action = theme_menu.addAction("Light")
         light_action.triggered.connect(self.set_theme_light)
 
+        # View menu
+        perf_panel_action = view_menu.addAction("Performance Panel")
+        perf_panel_action.setCheckable(True)
+        perf_panel_action.toggled.connect(self.game_view.perf_panel.set_enabled)
+
+        export_json_action = view_menu.addAction("Export Metrics (JSON)")
+        export_json_action.triggered.connect(self.export_metrics_json)
+
+        export_openmetrics_action = view_menu.addAction("Export Metrics (OpenMetrics)")
+        export_openmetrics_action.triggered.connect(self.export_metrics_openmetrics)
+
+    def export_metrics_json(self):
+        self.export_metrics("metrics.json", "JSON (*.json)", metrics.export_json)
+
+    def export_metrics_openmetrics(self):
+        self.export_metrics("metrics.txt", "OpenMetrics (*.txt)", metrics.export_openmetrics)
+
+    def export_metrics(self, default_name: str, file_filter: str, export):
+        file, _ = QFileDialog.getSaveFileName(self, "Export Metrics", default_name, file_filter)
+        if not file:
+            return
+        try:
+            with open(file, "w", encoding="utf-8") as f:
+                f.write(export())
+        except OSError as e:
+            self.show_error(f"Could not export the metrics: {e}")
+
     def set_theme_dark(self):
         self.theme = "dark"
+        self.chips_list.set_theme(self.theme)
         QApplication.instance().setStyleSheet(qdarkstyle.load_stylesheet(qt_api='pyside6'))
 
     def set_theme_light(self):
         self.theme = "light"
+        self.chips_list.set_theme(self.theme)
         QApplication.instance().setStyleSheet("")
     
     def set_base_url(self):
@@ -216,6 +339,7 @@ class MainWindow(QMainWindow):
         QMessageBox.critical(self, "Error", msg)
 
     def open_settings(self):
+        from settings import Settings
         settings = Settings(self)
         settings.exec()
 
@@ -228,9 +352,10 @@ class MainWindow(QMainWindow):
 
         result = dialog.exec()
         if result == QMessageBox.Yes:
+            self.stop_loading()
             self.chips_list.clear()
             self.populate_default_chips()
-            self.game_view.sc.clear()
+            self.game_view.clear()
             self.save_chips()
 
 if __name__ == "__main__":
@@ -240,4 +365,13 @@ if __name__ == "__main__":
         app.setStyleSheet(qdarkstyle.load_stylesheet(qt_api='pyside6'))
 
     window.show()
+
+    def report_startup():
+        # first event loop iteration after show, the window has been painted by now
+        elapsed_ms = (time.perf_counter() - START_TIME) * 1000
+        if os.environ.get("INFINITE_SIDES_STARTUP_CHECK"):
+            print(json.dumps({"time_to_window_ms": elapsed_ms, "modules": sorted(sys.modules)}))
+            app.quit()
+
+    QTimer.singleShot(0, report_startup)
     app.exec()
@@ -0,0 +1,98 @@
+import json, threading, time
+from collections import deque
+from contextlib import contextmanager
+
+# samples kept per metric for the percentiles
+WINDOW_SIZE = 512
+
+
+class Histogram:
+    """Rolling window of the latest samples plus lifetime count and sum"""
+
+    def __init__(self, window: int = WINDOW_SIZE) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "last": self.samples[-1] if self.samples else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": max(self.samples, default=0.0),
+        }
+
+
+class Metrics:
+    """
+    Timings and counters recorded along the merge path, durations are in milliseconds.
+    Safe to record from any thread.
+    """
+
+    def __init__(self) -> None:
+        self.__histograms: dict[str, Histogram] = {}
+        self.__counters: dict[str, int] = {}
+        self.__lock = threading.Lock()
+
+    def record(self, name: str, value: float):
+        with self.__lock:
+            if name not in self.__histograms:
+                self.__histograms[name] = Histogram()
+            self.__histograms[name].add(value)
+
+    def increment(self, name: str, amount: int = 1):
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    @contextmanager
+    def timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {
+                "histograms": {name: histogram.summary() for name, histogram in sorted(self.__histograms.items())},
+                "counters": dict(sorted(self.__counters.items())),
+            }
+
+    def export_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4)
+
+    def export_openmetrics(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, summary in snapshot["histograms"].items():
+            metric = "infinite_sides_" + name.replace(".", "_")
+            lines.append(f"# TYPE {metric} summary")
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(f'{metric}{{quantile="{quantile}"}} {summary[key]}')
+            lines.append(f"{metric}_sum {summary['sum']}")
+            lines.append(f"{metric}_count {summary['count']}")
+        for name, value in snapshot["counters"].items():
+            metric = "infinite_sides_" + name.replace(".", "_")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}_total {value}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+# shared by the whole app
+metrics = Metrics()
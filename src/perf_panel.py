@@ -0,0 +1,45 @@
+from PySide6.QtWidgets import QLabel, QWidget
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QFont
+from perf import metrics
+
+class PerfPanel(QLabel):
+    """Overlay with the rolling timings from `perf.metrics`, refreshed every second while shown"""
+
+    def __init__(self, parent: QWidget) -> None:
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: white; padding: 6px; border-radius: 6px;")
+        font = QFont("monospace")
+        font.setStyleHint(QFont.Monospace)
+        font.setPointSize(9)
+        self.setFont(font)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def set_enabled(self, enabled: bool):
+        if enabled:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+            self.hide()
+
+    def refresh(self):
+        snapshot = metrics.snapshot()
+        lines = [f"{'metric':<28}{'p50':>9}{'p95':>9}{'p99':>9}{'count':>8}"]
+        for name, summary in snapshot["histograms"].items():
+            lines.append(f"{name:<28}{summary['p50']:>9.1f}{summary['p95']:>9.1f}{summary['p99']:>9.1f}{summary['count']:>8}")
+        for name, value in snapshot["counters"].items():
+            lines.append(f"{name:<28}{value:>35}")
+        if len(lines) == 1:
+            lines.append("nothing recorded yet")
+
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(8, 8)
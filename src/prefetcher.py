@@ -0,0 +1,92 @@
+import asyncio, time
+from collections import deque
+
+from backend import AsyncBackendLLM
+from configmanager import ConfigManger
+from consts import DEFAULT_PREFETCH_ENABLED, DEFAULT_PREFETCH_PER_MINUTE, DEFAULT_PREFETCH_RECENT_CHIPS
+from event_loop import AsyncLoopThread
+
+# pairs waiting to be prefetched, older ones are dropped first
+MAX_PENDING_PAIRS = 50
+
+
+class Prefetcher:
+    """
+    Pre-generates combinations of a newly created chip with recently used chips
+    while no merge is running, the results land in the backend's combination cache.
+    At most `prefetch_per_minute` requests are made.
+    """
+
+    def __init__(self, llm: AsyncBackendLLM, loop: AsyncLoopThread, wait_idle, run_background) -> None:
+        self.llm = llm
+        self.loop = loop
+        # coroutine function that returns once no interactive merge is waiting or running
+        self.wait_idle = wait_idle
+        # generates a pair in a slot an interactive merge can take over, False when it did
+        self.run_background = run_background
+        self.conf_manager = ConfigManger()
+        self.enabled = False
+        self.per_minute = DEFAULT_PREFETCH_PER_MINUTE
+        self.recent: deque[str] = deque(maxlen=DEFAULT_PREFETCH_RECENT_CHIPS)
+        self.on_config_changed(self.conf_manager.get_config())
+        self.conf_manager.add_listener(self.on_config_changed)
+
+        # only touched on the loop thread
+        self.__pending: deque[tuple[str, str]] = deque(maxlen=MAX_PENDING_PAIRS)
+        self.__has_pending: asyncio.Event | None = None
+        self.__worker: asyncio.Task | None = None
+        self.__last_request = 0.0
+
+    def on_config_changed(self, conf: dict):
+        self.enabled = conf.get("prefetch_enabled", DEFAULT_PREFETCH_ENABLED)
+        self.per_minute = conf.get("prefetch_per_minute", DEFAULT_PREFETCH_PER_MINUTE)
+        recent_size = conf.get("prefetch_recent_chips", DEFAULT_PREFETCH_RECENT_CHIPS)
+        if recent_size != self.recent.maxlen:
+            self.recent = deque(self.recent, maxlen=recent_size)
+
+    def use(self, text: str):
+        """Remember a chip the player merged, called on the GUI thread"""
+        if text in self.recent:
+            self.recent.remove(text)
+        self.recent.append(text)
+
+    def discovered(self, text: str):
+        """Queue the pairs a new chip can form with the recently used ones, called on the GUI thread"""
+        if not self.enabled or self.per_minute <= 0:
+            return
+
+        # most recently used last, so it gets generated first
+        pairs = [(text, text)] + [(recent, text) for recent in self.recent if recent != text]
+        self.loop.call_soon(self.__enqueue, pairs)
+
+    def __enqueue(self, pairs: list[tuple[str, str]]):
+        self.__pending.extend(pairs)
+        if self.__has_pending is None:
+            self.__has_pending = asyncio.Event()
+        self.__has_pending.set()
+        if self.__worker is None or self.__worker.done():
+            self.__worker = asyncio.ensure_future(self.__run())
+
+    async def __run(self):
+        while True:
+            if not self.__pending:
+                self.__has_pending.clear()
+                await self.__has_pending.wait()
+
+            first, second = self.__pending.pop()
+            if not self.enabled or self.per_minute <= 0:
+                self.__pending.clear()
+                continue
+            if self.llm.cached_result(first, second) is not None:
+                continue
+
+            # stay within the request budget
+            interval = 60 / self.per_minute
+            if (wait := self.__last_request + interval - time.monotonic()) > 0:
+                await asyncio.sleep(wait)
+            await self.wait_idle()
+
+            self.__last_request = time.monotonic()
+            if not await self.run_background(first, second):
+                # gave way to a merge the player is waiting for, try again once things are idle
+                self.__pending.append((first, second))
@@ -0,0 +1,88 @@
+import sqlite3, threading, time
+
+from chip_text import normalize_chip_text
+
+
+class RecipeStore:
+    """
+    Which pair of chips produced which chip, with which model and when, stored in SQLite.
+    Pairs are stored normalized and sorted so `A + B` and `B + A` are the same recipe.
+    """
+
+    def __init__(self, file: str = "recipes.db") -> None:
+        self.file = file
+        # used from the GUI thread and the event loop thread
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(file, check_same_thread=False)
+        with self.__lock, self.__conn:
+            self.__conn.execute("PRAGMA journal_mode=WAL")
+            self.__conn.execute("PRAGMA synchronous=NORMAL")
+            self.__conn.execute("""
+                CREATE TABLE IF NOT EXISTS recipes (
+                    first_key TEXT NOT NULL,
+                    second_key TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    first TEXT NOT NULL,
+                    second TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    result_key TEXT NOT NULL,
+                    discovered_at REAL NOT NULL,
+                    PRIMARY KEY (first_key, second_key, model)
+                )
+            """)
+            # the primary key already covers lookups by the first parent
+            self.__conn.execute("CREATE INDEX IF NOT EXISTS recipes_second ON recipes (second_key)")
+            self.__conn.execute("CREATE INDEX IF NOT EXISTS recipes_result ON recipes (result_key)")
+            self.__conn.execute("CREATE INDEX IF NOT EXISTS recipes_model ON recipes (model)")
+
+    @staticmethod
+    def pair_keys(first: str, second: str) -> tuple[str, str]:
+        return tuple(sorted((normalize_chip_text(first), normalize_chip_text(second))))
+
+    def record(self, first: str, second: str, model: str, result: str):
+        """Keeps the first discovery of a recipe"""
+        first_key, second_key = self.pair_keys(first, second)
+        with self.__lock, self.__conn:
+            self.__conn.execute(
+                "INSERT OR IGNORE INTO recipes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (first_key, second_key, model, first, second, result, normalize_chip_text(result), time.time()),
+            )
+
+    def lookup(self, first: str, second: str, model: str) -> str | None:
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT result FROM recipes WHERE first_key = ? AND second_key = ? AND model = ?",
+                (*self.pair_keys(first, second), model),
+            ).fetchone()
+        return row[0] if row else None
+
+    def __select(self, where: str, params: tuple) -> list[dict]:
+        with self.__lock:
+            cursor = self.__conn.execute(
+                f"SELECT first, second, model, result, discovered_at FROM recipes WHERE {where} ORDER BY discovered_at",
+                params,
+            )
+            rows = cursor.fetchall()
+        return [
+            {"first": first, "second": second, "model": model, "result": result, "discovered_at": discovered_at}
+            for first, second, model, result, discovered_at in rows
+        ]
+
+    def by_parent(self, text: str) -> list[dict]:
+        key = normalize_chip_text(text)
+        # sqlite answers the OR from both indexes
+        return self.__select("first_key = ? OR second_key = ?", (key, key))
+
+    def by_result(self, text: str) -> list[dict]:
+        return self.__select("result_key = ?", (normalize_chip_text(text),))
+
+    def by_model(self, model: str) -> list[dict]:
+        return self.__select("model = ?", (model,))
+
+    def count(self) -> int:
+        with self.__lock:
+            return self.__conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
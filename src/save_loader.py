@@ -0,0 +1,29 @@
+from PySide6.QtCore import Signal, QThread
+from game_save import GameSave
+
+class SaveLoader(QThread):
+    """Reads the save off the GUI thread and hands it over in batches"""
+
+    # chips of the batch, chips loaded so far, total chips in the save
+    batch_loaded = Signal(list, int, int)
+    error = Signal(str)
+
+    def __init__(self, game_save: GameSave, batch_size: int = 500):
+        super().__init__(None)
+        self.game_save = game_save
+        self.batch_size = batch_size
+        # the save could not be read, it must not be overwritten
+        self.failed = False
+
+    def run(self):
+        loaded = 0
+        try:
+            for batch, total in self.game_save.iter_batches(self.batch_size):
+                if self.isInterruptionRequested():
+                    return
+                loaded += len(batch)
+                self.batch_loaded.emit(batch, loaded, total)
+        except Exception as e:
+            # game_save.loaded stays False, so nothing compacts over the unread file
+            self.failed = True
+            self.error.emit(str(e))
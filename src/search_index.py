@@ -0,0 +1,75 @@
+import re
+import unicodedata
+
+from chip_text import EMOJI_CHARS, normalize_chip_text
+
+EMOJI_CHAR_PATTERN = re.compile(f"[{EMOJI_CHARS}]")
+
+# longest n-gram indexed, longer queries intersect the n-grams they are made of
+GRAM_SIZE = 3
+
+
+def searchable_text(text: str) -> str:
+    """Normalized chip text followed by the names of its emoji, so `fire` finds `🔥 Blaze`"""
+    names = [unicodedata.name(emoji, "").lower() for emoji in EMOJI_CHAR_PATTERN.findall(text)]
+    return " ".join([normalize_chip_text(text), *names])
+
+
+def grams(text: str, size: int) -> set[str]:
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class ChipSearchIndex:
+    """
+    Substring search over chip texts through an n-gram index, updated as chips are added.
+    A query that extends the previous one only narrows down the previous result.
+    """
+
+    def __init__(self) -> None:
+        self.__texts: list[str] = []
+        self.__grams: dict[str, set[int]] = {}
+        self.__last_query = ""
+        self.__last_result: set[int] | None = None
+
+    def add(self, text: str) -> int:
+        row = len(self.__texts)
+        searchable = searchable_text(text)
+        self.__texts.append(searchable)
+        for size in range(1, GRAM_SIZE + 1):
+            for gram in grams(searchable, size):
+                self.__grams.setdefault(gram, set()).add(row)
+
+        if self.__last_result is not None and self.__last_query in searchable:
+            self.__last_result.add(row)
+        return row
+
+    def matches(self, row: int, query: str) -> bool:
+        return normalize_chip_text(query) in self.__texts[row]
+
+    def search(self, query: str) -> set[int] | None:
+        """Rows containing `query`, None when the query is empty and everything matches"""
+        query = normalize_chip_text(query)
+        if not query:
+            self.__last_query, self.__last_result = "", None
+            return None
+
+        if self.__last_result is not None and self.__last_query in query:
+            # typing more can only remove rows from the previous result
+            candidates = self.__last_result
+        else:
+            size = min(GRAM_SIZE, len(query))
+            sets = sorted((self.__grams.get(gram, set()) for gram in grams(query, size)), key=len)
+            candidates = set(sets[0]).intersection(*sets[1:]) if sets else set()
+
+        if len(query) > GRAM_SIZE or candidates is self.__last_result:
+            result = {row for row in candidates if query in self.__texts[row]}
+        else:
+            result = set(candidates)
+
+        self.__last_query, self.__last_result = query, result
+        return result
+
+    def clear(self):
+        self.__texts.clear()
+        self.__grams.clear()
+        self.__last_query, self.__last_result = "", None
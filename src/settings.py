@@ -19,7 +19,6 @@ from fetch_ollama_models import FetchModels
 from configmanager import ConfigManger
 from consts import DEFAULT_SYSTEM_MSG, DEFAULT_BASE_URL, DEFAULT_MODEL, DEFAULT_EXAMPLES, DEFAULT_CHIPS
 from example_entry_widget import ExampleEntry, ChipEntry
-from ollama import Client
 
 class Settings(QDialog):
 
@@ -30,9 +29,8 @@ class Settings(QDialog):
 
         self.setWindowTitle("Settings")
         self.setMinimumSize(980, 650)
-        self.__client = Client(host=conf["base_url"])
-        
-        self.model_fetcher = FetchModels(self.__client)
+
+        self.model_fetcher = FetchModels()
         self.model_fetcher.started.connect(self.fetch_models_started)
         self.model_fetcher.fetched.connect(self.fetch_models_finished)
         self.model_fetcher.error.connect(self.fetch_models_error)
@@ -0,0 +1,90 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from chip_text import extract_complete_result, normalize_chip_text, validate_result
+
+
+# completion -> result that gets cached and becomes a chip
+ACCEPTED = [
+    ("🌱 Plant", "🌱 Plant"),
+    (' "🌱 Plant" ', "🌱 Plant"),
+    ("“🌱 Plant”", "🌱 Plant"),
+    ("**🌱 Plant**", "🌱 Plant"),
+    ('"🌱 Plant', "🌱 Plant"),
+    ("= 🌱 Plant", "🌱 Plant"),
+    ('"🌍 Earth + 💧 Water" = 🌱 Plant', "🌱 Plant"),
+    ("🌋 Lava → 🌋 Volcano", "🌋 Volcano"),
+    ("Result: 🌱 Plant", "🌱 Plant"),
+    ("🌱Plant", "🌱 Plant"),
+    ("🌱  Plant", "🌱 Plant"),
+    ("🌱 Plant.", "🌱 Plant"),
+    ("🧑‍🚀 Astronaut!", "🧑‍🚀 Astronaut"),
+    ("🌱 Plant\nbecause plants grow", "🌱 Plant"),
+    ("🌱 Plant (grows from earth)", "🌱 Plant"),
+    ("🌱 Plant, a green thing", "🌱 Plant"),
+    ("🌱 Plant - a green living thing", "🌱 Plant"),
+    ("Plant 🌱", "🌱 Plant"),
+    ("🌬️ Wind Turbine", "🌬️ Wind Turbine"),
+    ("❄️ Ice", "❄️ Ice"),
+    ("🌱 St. Louis", "🌱 St. Louis"),
+    ("🌱 Mr. Plant", "🌱 Mr. Plant"),
+    ("🏙️ Washington, D.C.", "🏙️ Washington, D.C."),
+    ("🎬 Mission: Impossible", "🎬 Mission: Impossible"),
+    ("⏰ 12:00", "⏰ 12:00"),
+    ("💻 C++", "💻 C++"),
+    ("1️⃣ One", "1️⃣ One"),
+    ("One 1️⃣", "1️⃣ One"),
+    ("#️⃣ Hashtag", "#️⃣ Hashtag"),
+]
+
+# completions with no usable result, these are asked again and never cached
+REJECTED = [
+    "",
+    "   ",
+    "Plant",
+    "🌱",
+    "🌱 ...",
+    "🌍 Earth + 💧 Water",
+    "🌱 Plant is what you get when you combine them",
+    "1 One",
+]
+
+
+@pytest.mark.parametrize("raw, expected", ACCEPTED)
+def test_validate_result_accepts(raw, expected):
+    assert validate_result(raw) == expected
+
+
+@pytest.mark.parametrize("raw", REJECTED)
+def test_validate_result_rejects(raw):
+    assert validate_result(raw) is None
+
+
+@pytest.mark.parametrize("raw, expected", ACCEPTED)
+def test_validated_results_are_stable(raw, expected):
+    # a cached result is validated again before it is used
+    assert validate_result(expected) == expected
+
+
+@pytest.mark.parametrize("partial, expected", [
+    ('🌱 Plant"', "🌱 Plant"),
+    ("🌱 Plant\n", "🌱 Plant"),
+    ("🌱 Plant (", "🌱 Plant"),
+    ("🌱 Plant, a green thing", "🌱 Plant"),
+    ('🌱 St. Louis"', "🌱 St. Louis"),
+    ('🎬 Mission: Impossible"', "🎬 Mission: Impossible"),
+    ('⏰ 12:00"', "⏰ 12:00"),
+    ('1️⃣ One"', "1️⃣ One"),
+    ("🌱 Plant", None),
+    ("🌱 St.", None),
+    ("🌱 St. Lou", None),
+])
+def test_extract_complete_result(partial, expected):
+    assert extract_complete_result(partial) == expected
+
+
+def test_normalize_chip_text_keycap():
+    assert normalize_chip_text("1️⃣One") == normalize_chip_text("1⃣ one")
@@ -0,0 +1,46 @@
+import json, os, sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+pytest.importorskip("PySide6")
+pytest.importorskip("ollama")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from fake_ollama import FakeOllama
+
+
+def test_clear_while_finished_merge_is_queued(tmp_path, monkeypatch):
+    server = FakeOllama(latency=0.01).start()
+    monkeypatch.chdir(tmp_path)
+    with open("inf_config.json", "w") as f:
+        json.dump({"base_url": server.url, "model": server.models[0], "cache_size": 0, "stream": False, "recipe_lookup": False}, f)
+
+    errors = []
+    monkeypatch.setattr(sys, "excepthook", lambda *exc_info: errors.append(exc_info))
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from main import MainWindow
+
+    window = MainWindow()
+    app.processEvents()
+    game_view = window.game_view
+    game_view.add_chip("🌍 Earth")
+    game_view.add_chip("💧 Water")
+    chip1, chip2 = game_view.chips
+    chip1.loading = chip2.loading = True
+    task = game_view.scheduler.submit(chip1, chip2)
+
+    # finished on the loop thread, its signals are queued but not delivered yet
+    task.future.result(timeout=10)
+    game_view.clear()
+    app.processEvents()
+
+    assert task.cancelled
+    assert errors == []
+    assert game_view.chips == []
+    server.shutdown()